@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+
+import asyncio
+import collections
+import logging
+import socket
+import threading
+
+from codec import cmd_zone, res_zone
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AsyncGlobalCache:
+    """
+    asyncio counterpart to GlobalCache that keeps several commands in flight
+    on one stream.
+
+    Replies are framed on `\\r\\n` and handed to the oldest outstanding request
+    for the same zone. Replies that carry no zone (`#?`, `#ALLOFF`) go to the
+    oldest outstanding request of any kind, which is what the amp answers in
+    order. Zone lines nobody is waiting on are passed to on_unsolicited.
+    """
+
+    def __init__(self, host, port, timeout=None, on_unsolicited=None, pacer=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout or 5
+        self.on_unsolicited = on_unsolicited
+        self.pacer = pacer
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._pending = collections.deque()
+        self._connect_lock = None
+        self._write_lock = None
+
+    async def connect(self):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+            self._write_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            LOGGER.debug("Connecting to socket %s:%s", self.host, self.port)
+            try:
+                self._reader, self._writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, int(self.port)), self.timeout)
+            except ConnectionRefusedError:
+                LOGGER.error("Can not connect to GlobalCache device at %s:%s", self.host, self.port)
+                raise
+            except asyncio.TimeoutError:
+                LOGGER.error("Timeout connecting to GlobalCache device at %s:%s", self.host, self.port)
+                raise socket.timeout
+            self._read_task = asyncio.ensure_future(self._read_loop())
+
+    async def close(self):
+        if self._read_task is not None:
+            self._read_task.cancel()
+        self._drop(ConnectionError("GlobalCache client closed"))
+
+    async def msg(self, msg):
+        """
+        Send one command and wait for its reply. Returns the reply line, or
+        False for `#?`, like GlobalCache.msg.
+        """
+        await self.connect()
+        fut = asyncio.get_event_loop().create_future()
+        entry = (cmd_zone(msg), fut)
+        data = "{}\r\n".format(msg).encode()
+        async with self._write_lock:
+            if self.pacer is not None:
+                # sends queue up behind the lock, so they keep their order
+                delay = self.pacer.reserve(len(data))
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            self._pending.append(entry)
+            self._writer.write(data)
+            await self._writer.drain()
+        try:
+            res_str = await asyncio.wait_for(fut, self.timeout)
+        except asyncio.TimeoutError:
+            if entry in self._pending:
+                self._pending.remove(entry)
+            LOGGER.error("Timeout waiting on GlobalCache device at %s:%s for %s", self.host, self.port, msg)
+            raise socket.timeout
+        if res_str == "#?":
+            return False
+        return res_str
+
+    async def msg_many(self, msgs):
+        """
+        Pipeline several commands; results come back in the order given.
+        Failures are returned in place as False.
+        """
+        results = await asyncio.gather(*[self.msg(m) for m in msgs], return_exceptions=True)
+        return [False if isinstance(r, Exception) else r for r in results]
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if line == b'':
+                    raise ConnectionError("socket connection broken")
+                line = line.strip().decode(errors='replace')
+                if line:
+                    self._dispatch(line)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            LOGGER.error("GlobalCache stream %s:%s closed: %s", self.host, self.port, e)
+            self._drop(e)
+
+    def _dispatch(self, line):
+        if self.pacer is not None:
+            self.pacer.replied(len(line) + 2)
+        zone = res_zone(line)
+        for entry in self._pending:
+            if zone is None or entry[0] == zone:
+                self._pending.remove(entry)
+                if not entry[1].done():
+                    entry[1].set_result(line)
+                return
+        if zone is not None and self.on_unsolicited is not None:
+            self.on_unsolicited(line)
+        else:
+            LOGGER.debug("Unmatched reply from %s:%s: %s", self.host, self.port, line)
+
+    def _drop(self, err):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = self._read_task = None
+        while self._pending:
+            _, fut = self._pending.popleft()
+            if not fut.done():
+                fut.set_exception(err)
+
+
+class PipelinedGlobalCache:
+    """
+    Blocking facade over AsyncGlobalCache for the threaded node server. The
+    event loop runs in its own daemon thread, so any number of callers can
+    share one instance and their commands are pipelined on a single stream.
+    """
+    pipelined = True
+
+    def __init__(self, host, port, timeout=None, on_unsolicited=None, pacer=None):
+        self.host = host
+        self.port = port
+        self.loop = asyncio.new_event_loop()
+        self.client = AsyncGlobalCache(host, port, timeout, on_unsolicited, pacer)
+        self._thread = threading.Thread(target=self.loop.run_forever, name='GlobalCache', daemon=True)
+        self._thread.start()
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def msg(self, msg):
+        return self._run(self.client.msg(msg))
+
+    def msg_many(self, msgs):
+        return self._run(self.client.msg_many(msgs))
+
+    def close(self):
+        self._run(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
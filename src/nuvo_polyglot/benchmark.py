@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark from an inbound Polyglot message to the status
+publishes it causes.
+
+Runs the real Interface and controller in-process against a fake MQTT
+client and the amp simulator, feeds Controller._parseInput the same
+`command`/`query` dicts Interface._message puts on inQueue, and times each
+one until the first resulting `status` message reaches Interface.send.
+Results are printed (or written with --output) as JSON so runs can be
+compared:
+
+    python benchmark.py --model essentia --commands 300 --latency 0.005
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+
+class FakeMqttClient:
+    """
+    Stands in for paho's client under Interface.send; records when each
+    `status` publish for a node address happens.
+    """
+
+    def __init__(self):
+        self.published = 0
+        self.statuses = {}
+        self._cond = threading.Condition()
+
+    def publish(self, topic, payload, retain=False):
+        now = time.time()
+        message = json.loads(payload)
+        with self._cond:
+            self.published += 1
+            status = message.get('status')
+            if status is not None:
+                for s in status if isinstance(status, list) else [status]:
+                    self.statuses.setdefault(s['address'], []).append(now)
+                self._cond.notify_all()
+
+    def first_status(self, address, since, timeout):
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                for t in self.statuses.get(address, []):
+                    if t >= since:
+                        return t
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    samples = sorted(samples)
+
+    def pct(p):
+        return round(samples[min(len(samples) - 1, int(p / 100.0 * len(samples)))] * 1000, 3)
+
+    return {
+        'count': len(samples),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3),
+        'p50_ms': pct(50),
+        'p90_ms': pct(90),
+        'p99_ms': pct(99),
+        'max_ms': round(samples[-1] * 1000, 3),
+    }
+
+
+def workload(zones, count, query_every):
+    """
+    Synthetic inbound messages cycling through the zones. Every command
+    changes the zone so it always produces a status update.
+    """
+    steps = [('DON', None), ('SET_VOL', 30), ('SET_SRC', 2), ('SET_VOL', 60), ('SET_SRC', 1), ('DOF', None)]
+    for i in range(count):
+        address = zones[i % len(zones)]
+        if query_every and i % query_every == query_every - 1:
+            yield {'query': {'address': address}}
+            continue
+        cmd, value = steps[(i // len(zones)) % len(steps)]
+        command = {'address': address, 'cmd': cmd}
+        if value is not None:
+            command['value'] = str(value)
+        yield {'command': command}
+
+
+def feed(poly, message):
+    """
+    poly.input the way Interface._message does, in a trace of its own.
+    """
+    import tracing
+    with tracing.activate(tracing.start(next(iter(message)))):
+        poly.input(message)
+
+
+def run(args):
+    from simulator import NuvoSimulator
+    os.environ.setdefault('PROFILE_NUM', '1')
+    os.environ.setdefault('USE_HTTPS', 'false')
+    import poly_interface as polyinterface
+    import metrics
+    from nuvo_factory import nuvo_factory
+    __import__(args.model)
+
+    sim = NuvoSimulator(args.model, latency=args.latency, jitter=args.jitter, drop=args.drop).start()
+    poly = polyinterface.Interface('Benchmark')
+    mqttc = FakeMqttClient()
+    poly._mqttc = mqttc
+    poly.connected = True
+    if args.batch_status:
+        poly.features.add('batchstatus')
+
+    Controller = nuvo_factory.get_controller(args.model.upper())
+    control = Controller(poly)
+    poly.inConfig({
+        'isyVersion': '5.0.0',
+        'nodes': [],
+        'notices': {},
+        'customParamsDoc': '',
+        'customParams': {
+            'host': sim.host,
+            'port': str(sim.port),
+            'persistent': str(args.persistent).lower(),
+            'pipelined': str(args.pipelined).lower(),
+            'listen': 'false',
+            'trace': str(args.trace).lower(),
+            'baud': str(args.baud),
+            # background polls would add amp traffic of their own
+            'poll_active': '0',
+        },
+    })
+    control._threads['ns'].join(30)
+    # Polyglot's answer to the addnode, which starts the first sweep
+    feed(poly, {'result': {'addnode': {'nodes': [
+        {'address': address, 'success': True} for address in control.nodesAdding]}}})
+    poly.inQueue.join()
+    zones = sorted(node.address for node in control.zones.values())
+
+    # latency: one message at a time
+    status_lat, done_lat = [], []
+    for message in workload(zones, args.commands, args.query_every):
+        address = list(message.values())[0]['address']
+        start = time.time()
+        feed(poly, message)
+        poly.inQueue.join()
+        done_lat.append(time.time() - start)
+        # a message that changed nothing may legitimately publish nothing
+        first = mqttc.first_status(address, start, 0)
+        if first is not None:
+            status_lat.append(first - start)
+
+    # throughput: everything queued at once
+    burst = list(workload(zones, args.commands, args.query_every))
+    start = time.time()
+    for message in burst:
+        feed(poly, message)
+    poly.inQueue.join()
+    elapsed = time.time() - start
+
+    results = {
+        'model': args.model,
+        'commands': args.commands,
+        'persistent': args.persistent,
+        'pipelined': args.pipelined,
+        'batch_status': args.batch_status,
+        'trace': args.trace,
+        'amp_latency_s': args.latency,
+        'baud': args.baud,
+        'amp_jitter_s': args.jitter,
+        'amp_drop': args.drop,
+        'status_latency': percentiles(status_lat),
+        'handled_latency': percentiles(done_lat),
+        'no_status': len(done_lat) - len(status_lat),
+        'burst_seconds': round(elapsed, 3),
+        'commands_per_second': round(len(burst) / elapsed, 2) if elapsed else None,
+        'mqtt_published': mqttc.published,
+        'amp_commands': sim.commands,
+        'amp_dropped': sim.dropped,
+        'transport': control.transport.stats() if control.transport else None,
+        'serial_line': control.pacer.stats() if control.pacer else None,
+        'lanes': control.lanes.stats(),
+        'inbound_collapsed': poly.inQueue.collapsed,
+        'startup': poly.startup,
+        'metrics': metrics.REGISTRY.summary(),
+    }
+    control.stop()
+    sim.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Nuvo node server end-to-end benchmark')
+    parser.add_argument('--model', choices=('essentia', 'concerto'), default='essentia')
+    parser.add_argument('--commands', type=int, default=120)
+    parser.add_argument('--query-every', type=int, default=5, help='every Nth message is a query, 0 for none')
+    parser.add_argument('--latency', type=float, default=0.0, help='simulated amp seconds per reply')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--drop', type=float, default=0.0)
+    parser.add_argument('--persistent', type=lambda v: v.lower() != 'false', default=True)
+    parser.add_argument('--pipelined', type=lambda v: v.lower() == 'true', default=False)
+    parser.add_argument('--batch-status', type=lambda v: v.lower() == 'true', default=False)
+    parser.add_argument('--baud', type=int, default=0, help='pace commands to this serial line rate, 0 for none')
+    parser.add_argument('--trace', type=lambda v: v.lower() == 'true', default=False)
+    parser.add_argument('--output', help='write JSON results here instead of stdout')
+    args = parser.parse_args()
+
+    results = run(args)
+    # init_interface sent stdout to the log, results go to the console
+    sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
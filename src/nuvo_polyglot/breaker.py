@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+import logging
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+
+
+class CircuitOpenError(ConnectionError):
+    """
+    Raised instead of touching the wire while the breaker is open.
+    """
+    pass
+
+
+class CircuitBreaker:
+    """
+    Fails fast once the GlobalCache looks unreachable.
+
+    After `threshold` consecutive failures the breaker opens and every
+    command is refused immediately. A background thread then waits
+    `cooldown` seconds and calls probe() (which should raise if the device is
+    still down), repeating until a probe succeeds and the breaker closes
+    again. on_change(state) is called on every transition until stop().
+    """
+
+    def __init__(self, threshold=3, cooldown=30, probe=None, on_change=None):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.probe = probe
+        self.on_change = on_change
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def allow(self):
+        return self.state == CLOSED
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state != CLOSED or self.failures < self.threshold:
+                return
+            self.state = OPEN
+            self.opened_at = time.time()
+        LOGGER.error("Circuit breaker open after %s failures, retrying in %ss", self.failures, self.cooldown)
+        self._changed()
+        threading.Thread(target=self._probe_loop, name='Breaker', daemon=True).start()
+
+    def stop(self):
+        """
+        End the probe thread and report no more transitions, e.g. once the
+        breaker has been replaced.
+        """
+        self.on_change = None
+        self._stopped.set()
+
+    def _probe_loop(self):
+        while True:
+            if self._stopped.wait(self.cooldown):
+                return
+            try:
+                if self.probe is not None:
+                    self.probe()
+            except Exception as e:
+                LOGGER.warning("Circuit breaker probe failed: %s", e)
+                continue
+            break
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+        LOGGER.info("Circuit breaker closed, device reachable again")
+        self._changed()
+
+    def _changed(self):
+        on_change = self.on_change
+        if on_change is not None:
+            try:
+                on_change(self.state)
+            except Exception as e:
+                LOGGER.error("Circuit breaker on_change failed: %s", e)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Table-driven Nuvo protocol codec shared by the Essentia and Concerto nodes.
+
+A model spec describes the status line and the command words; NuvoCodec
+compiles it once and then builds per-zone command strings from cached
+templates and decodes status lines straight into driver values.
+"""
+
+import re
+
+ESSENTIA_SPEC = {
+    'model': 'essentia',
+    # `#Z01PWRON,SRC2,GRP0,VOL-62,POFF` | `#Z01PWROFF`
+    'status': r'^#Z0?([0-9]+)PWR(ON|OFF)(?:,SRC([0-9]),GRP([0-9]),VOL-?([0-9]+|MT),P(?:ON|OFF))?',
+    'groups': {'source': 3, 'group': 4, 'volume': 5},
+    'muted': 'MT',
+    'commands': {
+        'ON': 'ON',
+        'OFF': 'OFF',
+        'QUERY': 'CONSR',
+        'VOL': 'VOL',
+        'SRC': 'SRC',
+        'GRP': 'GRP',
+        'MUTEON': 'MTON',
+        'MUTEOFF': 'MTOFF',
+    },
+}
+
+CONCERTO_SPEC = {
+    'model': 'concerto',
+    # `#Z3,ON,SRC1,VOL44,DND0,LOCK0` | `#Z1,OFF`
+    'status': r'^#Z([0-9]+),(ON|OFF)(?:,SRC([0-9]),VOL-?([0-9]+|MUTE),DND(?:0|1),LOCK(?:0|1))?',
+    'groups': {'source': 3, 'group': None, 'volume': 4},
+    'muted': 'MUTE',
+    'commands': {
+        'ON': 'ON',
+        'OFF': 'OFF',
+        'QUERY': 'STATUS?',
+        'VOL': 'VOL',
+        'SRC': 'SRC',
+        'MUTEON': 'MUTEON',
+        'MUTEOFF': 'MUTEOFF',
+    },
+}
+
+# percent (0-100) -> amp attenuation, as ZoneNode.denormalize_volume
+VOLUME_OUT = ["{:0>2}".format(79 - int(round(float(p) / 100 * 79, 2))) for p in range(101)]
+# amp attenuation -> percent, as ZoneNode.normalize_volume; keyed by both
+# `5` and `05` so the reply text can be looked up as is
+VOLUME_IN = {}
+for _att in range(100):
+    VOLUME_IN[str(_att)] = VOLUME_IN["{:0>2}".format(_att)] = "{:0>2}".format(int(round((1 - float(_att) / 80) * 100, 0)))
+del _att
+
+# `*Z01ON`, `*Z3VOL40` -> zone number of the request
+CMD_ZONE_PAT = re.compile(r'^\*Z0?([0-9]+)', re.IGNORECASE)
+# `#Z01PWRON,...`, `#Z3,ON,...` -> zone number of the reply
+RES_ZONE_PAT = re.compile(r'^#Z0?([0-9]+)')
+
+
+def cmd_zone(cmd):
+    m = CMD_ZONE_PAT.match(cmd)
+    return int(m.group(1)) if m else None
+
+
+def res_zone(line):
+    m = RES_ZONE_PAT.match(line)
+    return int(m.group(1)) if m else None
+
+
+class NuvoCodec:
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.model = spec['model']
+        self._status = re.compile(spec['status'])
+        self._source = spec['groups']['source']
+        self._group = spec['groups']['group']
+        self._volume = spec['groups']['volume']
+        self._muted = spec['muted']
+        self._templates = {}
+
+    def templates(self, address):
+        """
+        Command strings for one zone, e.g. {'ON': '*Z01ON', 'VOL': '*Z01VOL'}.
+        Built on first use and cached per address.
+        """
+        templates = self._templates.get(address)
+        if templates is None:
+            prefix = '*' + address.upper()
+            templates = dict((kind, prefix + cmd) for kind, cmd in self.spec['commands'].items())
+            self._templates[address] = templates
+        return templates
+
+    def encode(self, address, kind, value=None):
+        """
+        Command string for kind (a key of the spec's commands), with value
+        appended when given. None if the model has no such command.
+        """
+        cmd = self.templates(address).get(kind)
+        if cmd is None or value is None:
+            return cmd
+        return cmd + str(value)
+
+    def volume(self, address, percent):
+        percent = min(max(int(percent), 0), 100)
+        return self.encode(address, 'VOL', VOLUME_OUT[percent])
+
+    def zone(self, line):
+        m = self._match(line)
+        return int(m.group(1)) if m else None
+
+    def decode(self, line):
+        """
+        Status line -> driver values, e.g. {'ST': 1, 'GV1': 0, 'GV2': 0,
+        'GV3': 2, 'GV4': '22'}. Returns False for `#?` and anything that is
+        not a status line. A line cut short after the power state still
+        yields ST. Never raises.
+        """
+        m = self._match(line)
+        if m is None:
+            return False
+        status = {'ST': 1 if m.group(2) == 'ON' else 0}
+        if status['ST'] == 1 and m.group(self._source) is not None:
+            volume = m.group(self._volume)
+            status['GV1'] = int(m.group(self._group)) if self._group else 0
+            status['GV2'] = 1 if volume == self._muted else 0
+            status['GV3'] = int(m.group(self._source))
+            if status['GV2'] == 0 and volume in VOLUME_IN:
+                status['GV4'] = VOLUME_IN[volume]
+        return status
+
+    def _match(self, line):
+        if isinstance(line, bytes):
+            line = line.decode(errors='replace')
+        if not isinstance(line, str):
+            return None
+        return self._status.match(line)
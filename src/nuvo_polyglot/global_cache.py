@@ -2,45 +2,248 @@
 
 import socket, select
 import logging
-from time import sleep
+import threading
+import time
+
+from codec import cmd_zone, res_zone
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _Connection:
+    """
+    A pooled socket plus whatever bytes were read past the last reply line.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b''
+        self.last_used = time.time()
+
+    def close(self):
+        try:
+            self.sock.close()
+        except socket.error:
+            pass
+
+
+class ConnectionPool:
+    """
+    Small pool of persistent sockets to a single GlobalCache endpoint. An
+    iTach serial port takes one session at a time, so by default it holds
+    a single socket.
+
+    Idle sockets are kept open with TCP keepalive and checked before they are
+    handed out again, so a connection the iTach dropped is replaced with a
+    fresh one instead of failing the next command. Status lines the amp
+    pushed onto an idle socket are passed to on_unsolicited.
+    """
+
+    def __init__(self, host, port, timeout=5, size=1, keepalive=30, on_unsolicited=None):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.size = size
+        self.keepalive = keepalive
+        self.on_unsolicited = on_unsolicited
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._closed = False
+
+    def acquire(self):
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    if self._closed:
+                        raise RuntimeError("connection pool to {}:{} is closed".format(self.host, self.port))
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return self._open()
+                if self._is_alive(conn):
+                    return conn
+                conn.close()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn, broken=False):
+        try:
+            if broken:
+                conn.close()
+            else:
+                conn.last_used = time.time()
+                self._keep(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        """
+        Close the idle sockets. Sockets still handed out are closed as they
+        come back, and nothing is handed out any more.
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def _keep(self, conn):
+        with self._lock:
+            if not self._closed:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def watch(self, timeout=1):
+        """
+        Wait up to timeout for the amp to push onto an idle socket and pass
+        what it pushed to on_unsolicited. With no socket open at all one is
+        opened, so pushed status keeps arriving between commands.
+        """
+        with self._lock:
+            idle = list(self._idle)
+        if not idle:
+            if not self._open_idle():
+                # a command has the socket, it comes back idle
+                time.sleep(min(timeout, 0.1))
+            return
+        try:
+            readable = select.select([conn.sock for conn in idle], [], [], timeout)[0]
+        except (socket.error, ValueError):
+            # closed under us by close()
+            return
+        for conn in idle:
+            # one handed out meanwhile is checked by acquire() instead
+            if conn.sock not in readable or not self._slots.acquire(blocking=False):
+                continue
+            try:
+                with self._lock:
+                    if conn not in self._idle:
+                        continue
+                    self._idle.remove(conn)
+                if self._is_alive(conn):
+                    self._keep(conn)
+                else:
+                    conn.close()
+            finally:
+                self._slots.release()
+
+    def _open_idle(self):
+        """
+        Open an idle socket if there is none open, idle or handed out.
+        Holding every slot keeps acquire() from opening one meanwhile.
+        """
+        taken = 0
+        while taken < self.size and self._slots.acquire(blocking=False):
+            taken += 1
+        try:
+            if taken < self.size:
+                return False
+            with self._lock:
+                if self._idle:
+                    return True
+            self._keep(self._open())
+            return True
+        finally:
+            for _ in range(taken):
+                self._slots.release()
+
+    def _open(self):
+        LOGGER.debug("Connecting to socket %s:%s", self.host, self.port)
+        sock = socket.create_connection((self.host, int(self.port)), self.timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        if hasattr(socket, 'TCP_KEEPIDLE'):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, self.keepalive)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, self.keepalive)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+        return _Connection(sock)
+
+    def _is_alive(self, conn):
+        """
+        A readable idle socket is either closed by the peer or holding stale
+        lines nobody asked for; take the latter off the socket so they are not
+        mistaken for the reply to the next command.
+        """
+        stale = conn.buffer
+        try:
+            while select.select([conn.sock], [], [], 0)[0]:
+                chunk = conn.sock.recv(1024)
+                if chunk == b'':
+                    return False
+                stale += chunk
+        except (socket.error, ValueError):
+            return False
+        conn.buffer = b''
+        for line in stale.replace(b'\r', b'\n').split(b'\n'):
+            line = line.strip().decode(errors='replace')
+            if line.startswith('#Z') and self.on_unsolicited is not None:
+                self.on_unsolicited(line)
+            elif line:
+                LOGGER.debug("Discarding stale data from %s:%s: %s", self.host, self.port, line)
+        return True
+
 
 class GlobalCache:
 
-    def __init__(self, host, port, timeout=None):
+    def __init__(self, host, port, timeout=None, persistent=False, pool_size=1, on_unsolicited=None, pacer=None):
         self.sock = None
+        self.pacer = pacer
         self.host = host
         self.port = port
         self.timeout = timeout or 5
+        self.persistent = persistent
+        self.pool = ConnectionPool(host, port, self.timeout, pool_size,
+                                   on_unsolicited=on_unsolicited) if persistent else None
 
     def _setup_socket(self):
         if self.sock is None:
             self.sock = socket.socket(
                 socket.AF_INET, socket.SOCK_STREAM)
             self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            # self.sock.settimeout(self.timeout)
+            self.sock.settimeout(self.timeout)
 
     def _connect(self):
         if self.sock is None:
-            print("Setting up socket {0}:{1}".format(self.host, str(self.port)))
+            LOGGER.debug("Setting up socket %s:%s", self.host, self.port)
             self._setup_socket()
-        print("Connecting to socket {0}:{1}".format(self.host, str(self.port)))
+        LOGGER.debug("Connecting to socket %s:%s", self.host, self.port)
         self.sock.connect((self.host, int(self.port)))
 
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+
+    def watch(self, timeout=1):
+        """
+        Wait up to timeout for status pushed onto the pooled sockets, see
+        ConnectionPool.watch. Only persistent clients keep sockets to watch.
+        """
+        if self.pool is None:
+            raise RuntimeError("only a persistent GlobalCache can be watched")
+        self.pool.watch(timeout)
+
     def msg(self, msg):
+        if self.persistent:
+            return self._msg_persistent(msg)
+
         totalsent = 0
         msg = "{}\r\n".format(msg).encode()
         msglen = len(msg)
         try:
             self._connect()
-            print("Sending msg {2} {0}:{1}".format(self.host, str(self.port), msg))
+            if self.pacer is not None:
+                self.pacer.wait(msglen)
+            LOGGER.debug("Sending msg %s %s:%s", msg, self.host, self.port)
             while totalsent < msglen:
                 sent = self.sock.send(msg[totalsent:])
                 if sent == 0:
                     raise RuntimeError("socket connection broken")
                 totalsent = totalsent + sent
 
-            print("Sent msg {2} {0}:{1}".format(self.host, str(self.port), msg))
-            r, _, _ = select.select([self.sock], [], [])
+            LOGGER.debug("Sent msg %s %s:%s", msg, self.host, self.port)
+            r, _, _ = select.select([self.sock], [], [], self.timeout)
             if r:
                 result=[]
                 chunks = []
@@ -52,22 +255,137 @@ class GlobalCache:
                     chunks.append(chunk)
                     bytes_recd = bytes_recd + len(chunk)
             else:
-                return False
+                raise socket.timeout
 
             res_str = b"".join(chunks)
-            print("recieved ({0}): {1}".format(len(res_str.decode()), res_str.decode()))
+            LOGGER.debug("recieved (%s): %s", len(res_str), res_str)
+            if self.pacer is not None:
+                self.pacer.replied(len(res_str))
             if res_str == "#?":
                 return False
             else:
                 return res_str.decode()
 
         except(ConnectionRefusedError):
-            logging.error("Can not connect to GlobalCache device at {}:{}".format(self.host, self.port))
+            LOGGER.error("Can not connect to GlobalCache device at %s:%s", self.host, self.port)
             raise ConnectionRefusedError
         except(socket.timeout):
-            logging.error("Timeout connecting to GlobalCache device at {}:{}".format(self.host, self.port))
+            LOGGER.error("Timeout connecting to GlobalCache device at %s:%s", self.host, self.port)
             raise socket.timeout
         finally:
-            self.sock.close()
+            if self.sock is not None:
+                self.sock.close()
             self.sock = None
-            sleep(0.05)
+
+    def msg_many(self, msgs):
+        """
+        Send several commands back to back; in persistent mode they share one
+        pooled connection. Replies come back in order, False for any command
+        that failed.
+        """
+        if self.persistent:
+            return self._msg_persistent(msgs, strict=False)
+        results = []
+        for msg in msgs:
+            try:
+                results.append(self.msg(msg))
+            except (socket.error, RuntimeError):
+                results.append(False)
+        return results
+
+    def _msg_persistent(self, msgs, strict=True):
+        """
+        Send msgs over one pooled connection and read back one reply line for
+        each. A socket found broken while sending or reading is dropped and
+        the command is retried once on a fresh connection. With strict=False
+        failures are returned as False instead of raised.
+        """
+        if not isinstance(msgs, list):
+            return self._msg_persistent([msgs], strict)[0]
+        results = []
+        conn = None
+        retried = False
+        try:
+            while len(results) < len(msgs):
+                data = "{}\r\n".format(msgs[len(results)]).encode()
+                if conn is None:
+                    try:
+                        conn = self.pool.acquire()
+                    except(ConnectionRefusedError, socket.timeout) as e:
+                        LOGGER.error("Can not connect to GlobalCache device at %s:%s", self.host, self.port)
+                        if strict:
+                            raise e.__class__
+                        results.extend([False] * (len(msgs) - len(results)))
+                        break
+                try:
+                    if self.pacer is not None:
+                        self.pacer.wait(len(data))
+                    LOGGER.debug("Sending msg %s %s:%s", data, self.host, self.port)
+                    conn.sock.sendall(data)
+                    res_str = self._recv_reply(conn, msgs[len(results)])
+                except(socket.timeout):
+                    # a late reply would be read as the next one, start over
+                    self.pool.release(conn, broken=True)
+                    conn = None
+                    LOGGER.error("Timeout waiting on GlobalCache device at %s:%s", self.host, self.port)
+                    if strict:
+                        raise socket.timeout
+                    results.append(False)
+                    continue
+                except(socket.error, RuntimeError) as e:
+                    self.pool.release(conn, broken=True)
+                    conn = None
+                    if retried:
+                        if strict:
+                            raise
+                        results.append(False)
+                        continue
+                    retried = True
+                    LOGGER.warning("Reconnecting to GlobalCache device at %s:%s: %s", self.host, self.port, e)
+                    continue
+                LOGGER.debug("recieved (%s): %s", len(res_str), res_str)
+                if self.pacer is not None:
+                    self.pacer.replied(len(res_str) + 2)
+                results.append(False if res_str == "#?" else res_str)
+        finally:
+            if conn is not None:
+                self.pool.release(conn)
+        return results
+
+    def _recv_reply(self, conn, msg):
+        """
+        Read lines until the reply to msg: a status for its zone, or a line
+        carrying no zone (`#?`, `#ALLOFF`). What the amp pushed for other
+        zones meanwhile goes to on_unsolicited, as AsyncGlobalCache does.
+        Raises socket.timeout once timeout seconds have passed in all.
+        """
+        zone = cmd_zone(msg)
+        deadline = time.time() + self.timeout
+        try:
+            while True:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise socket.timeout
+                conn.sock.settimeout(remaining)
+                line = self._recv_line(conn)
+                got = res_zone(line)
+                if got is None or got == zone:
+                    return line
+                if self.pool.on_unsolicited is not None:
+                    self.pool.on_unsolicited(line)
+                else:
+                    LOGGER.debug("Unmatched reply from %s:%s: %s", self.host, self.port, line)
+        finally:
+            conn.sock.settimeout(self.timeout)
+
+    def _recv_line(self, conn):
+        while True:
+            buf = conn.buffer.lstrip(b'\r\n')
+            end = min([i for i in (buf.find(b'\r'), buf.find(b'\n')) if i >= 0], default=-1)
+            if end >= 0:
+                conn.buffer = buf[end + 1:]
+                return buf[:end].decode()
+            chunk = conn.sock.recv(64)
+            if chunk == b'':
+                raise RuntimeError("socket connection broken")
+            conn.buffer = buf + chunk
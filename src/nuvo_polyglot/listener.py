@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+import logging
+import socket
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+
+class StatusListener(threading.Thread):
+    """
+    Long-lived reader for the status lines the amp pushes on its own when a
+    keypad is used (`#Z01PWRON,...` on Essentia, `#Z3,ON,...` on Concerto).
+
+    Holds its own connection to the GlobalCache, frames what it reads on
+    `\\r\\n` and hands every zone line to on_status. A dropped connection is
+    retried every `retry` seconds until stop() is called.
+
+    Given a persistent GlobalCache as client it opens no connection of its
+    own, since the bridge may only take one session. It waits on the
+    client's pooled sockets instead, which hand pushed lines to their
+    on_unsolicited.
+    """
+
+    def __init__(self, host, port, on_status, timeout=None, retry=5, client=None):
+        super(StatusListener, self).__init__(name='Listener', daemon=True)
+        self.host = host
+        self.port = port
+        self.on_status = on_status
+        self.timeout = timeout or 5
+        self.retry = retry
+        self.client = client
+        self._stopped = threading.Event()
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        if self.client is not None:
+            return self._watch()
+        while not self._stopped.is_set():
+            try:
+                sock = socket.create_connection((self.host, int(self.port)), self.timeout)
+            except (socket.error, socket.timeout) as e:
+                LOGGER.warning("Listener can not connect to GlobalCache device at %s:%s: %s", self.host, self.port, e)
+            else:
+                LOGGER.info("Listening for status from %s:%s", self.host, self.port)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                # short reads so stop() is noticed
+                sock.settimeout(1)
+                try:
+                    self._read(sock)
+                except (socket.error, RuntimeError) as e:
+                    LOGGER.warning("Listener lost GlobalCache device at %s:%s: %s", self.host, self.port, e)
+                finally:
+                    sock.close()
+            self._stopped.wait(self.retry)
+
+    def _watch(self):
+        LOGGER.info("Listening for status on the connections to %s:%s", self.host, self.port)
+        while not self._stopped.is_set():
+            try:
+                self.client.watch(1)
+            except (socket.error, RuntimeError) as e:
+                LOGGER.warning("Listener can not reach GlobalCache device at %s:%s: %s", self.host, self.port, e)
+                self._stopped.wait(self.retry)
+
+    def _read(self, sock):
+        buf = b''
+        while not self._stopped.is_set():
+            try:
+                chunk = sock.recv(256)
+            except socket.timeout:
+                continue
+            if chunk == b'':
+                raise RuntimeError("socket connection broken")
+            buf += chunk.replace(b'\r', b'\n')
+            while b'\n' in buf:
+                line, buf = buf.split(b'\n', 1)
+                line = line.strip().decode(errors='replace')
+                if line.startswith('#Z'):
+                    self._emit(line)
+
+    def _emit(self, line):
+        try:
+            self.on_status(line)
+        except Exception as e:
+            LOGGER.error("Listener failed handling %s: %s", line, e)
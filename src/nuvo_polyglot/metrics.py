@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+In-process metrics: counters, gauges and latency histograms.
+
+Everything registers with the module's REGISTRY by name plus optional
+labels, so the same metric can be fed from several places:
+
+    metrics.counter('nuvo_wire_errors_total', kind='timeout').inc()
+    metrics.histogram('nuvo_command_seconds', cmd='DON').observe(0.042)
+
+REGISTRY.render() gives the Prometheus text format, MetricsServer serves it
+over HTTP and REGISTRY.summary() is a short dict for the log.
+"""
+
+import bisect
+import http.server
+import logging
+import socketserver
+import threading
+
+LOGGER = logging.getLogger(__name__)
+
+# seconds; covers a cached reply through a GlobalCache timeout
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+class Counter:
+
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+
+class Gauge:
+    """
+    A value that is set, or read from fn each time it is rendered.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, fn=None):
+        self.fn = fn
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    @property
+    def value(self):
+        if self.fn is None:
+            return self._value
+        try:
+            return self.fn()
+        except Exception as e:
+            LOGGER.debug("Gauge read failed: %s", e)
+            return 0
+
+
+class Histogram:
+
+    kind = 'histogram'
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-th quantile (the largest bound
+        for values past it), None when empty.
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for i, n in enumerate(self.counts):
+                seen += n
+                if seen >= rank:
+                    return self.buckets[min(i, len(self.buckets) - 1)]
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, labels, *args):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = cls(*args)
+        return metric
+
+    def counter(self, name, **labels):
+        return self._get(Counter, name, labels)
+
+    def gauge(self, name, fn=None, **labels):
+        gauge = self._get(Gauge, name, labels)
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, buckets=LATENCY_BUCKETS, **labels):
+        return self._get(Histogram, name, labels, buckets)
+
+    def items(self):
+        with self._lock:
+            return sorted(self._metrics.items(), key=lambda item: item[0])
+
+    def total(self, name):
+        """
+        Sum of a counter over all its labels.
+        """
+        return sum(m.value for (n, _), m in self.items() if n == name and m.kind == 'counter')
+
+    def render(self):
+        lines = []
+        typed = set()
+        for (name, labels), metric in self.items():
+            if name not in typed:
+                typed.add(name)
+                lines.append("# TYPE {} {}".format(name, metric.kind))
+            if metric.kind != 'histogram':
+                lines.append("{}{} {}".format(name, _labels(labels), metric.value))
+                continue
+            seen = 0
+            for bound, n in zip(metric.buckets + ('+Inf',), metric.counts):
+                seen += n
+                lines.append("{}_bucket{} {}".format(name, _labels(labels + (('le', bound),)), seen))
+            lines.append("{}_sum{} {}".format(name, _labels(labels), round(metric.sum, 6)))
+            lines.append("{}_count{} {}".format(name, _labels(labels), metric.count))
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        Counters and gauges by name and label, histograms as count and p50/p90
+        in milliseconds.
+        """
+        out = {}
+        for (name, labels), metric in self.items():
+            key = name + _labels(labels)
+            if metric.kind == 'histogram':
+                if metric.count:
+                    out[key] = {'count': metric.count,
+                                'p50_ms': _ms(metric.quantile(0.5)),
+                                'p90_ms': _ms(metric.quantile(0.9))}
+            else:
+                out[key] = metric.value
+        return out
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, v) for k, v in labels) + '}'
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        LOGGER.debug("Metrics %s", format % args)
+
+
+class _Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class MetricsServer:
+    """
+    Serves REGISTRY as text on http://host:port/metrics.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, registry=REGISTRY):
+        self._server = _Server((host, int(port)), _Handler)
+        self._server.registry = registry
+        self.host, self.port = self._server.server_address
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='Metrics', daemon=True).start()
+        LOGGER.info("Serving metrics on http://%s:%s/metrics", self.host, self.port)
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,671 @@
+#!/usr/bin/env python3
+"""
+Controller and zone node shared by the Essentia and Concerto drivers.
+
+Everything but the protocol and a few amp specifics lives here: the
+transport, listener, poller and metrics plumbing and the customParams that
+drive them. A driver subclasses both classes, sets its codec, id, zone
+addresses and baud, and adds its ALLON/ALLOFF commands.
+"""
+
+import math
+import threading
+import poly_interface as polyinterface
+from transport import Transport, make_client, probe, COMMAND, REFRESH
+from breaker import CircuitBreaker, CLOSED
+from listener import StatusListener
+from poller import PollScheduler
+from pacer import LinePacer, bits_per_char
+import metrics
+import profiler
+import tracing
+from codec import res_zone
+
+LOGGER = polyinterface.LOGGER
+
+
+def number(value, cast=float, low=0, high=None):
+    """
+    value as a finite number from low to high, None if it is not one.
+    """
+    try:
+        result = cast(str(value).strip())
+    except ValueError:
+        return None
+    if not math.isfinite(result) or result < low or (high is not None and result > high):
+        return None
+    return result
+
+
+class NuvoController(polyinterface.Controller):
+    """
+    The Controller Class is the primary node from an ISY perspective. It is a Superclass
+    of polyinterface.Node so all methods from polyinterface.Node are available to this
+    class as well.
+
+    Class Variables:
+    self.nodes: Dictionary of nodes. Includes the Controller node. Keys are the node addresses
+    self.name: String name of the node
+    self.address: String Address of Node, must be less than 14 characters (ISY limitation)
+    self.polyConfig: Full JSON config dictionary received from Polyglot for the controller Node
+    self.added: Boolean Confirmed added to ISY as primary node
+    self.config: Dictionary, this node's Config
+
+    Class Methods (not including the Node methods):
+    start(): Once the NodeServer config is received from Polyglot this method is automatically called.
+    addNode(polyinterface.Node, update = False): Adds Node to self.nodes and polyglot/ISY. This is called
+        for you on the controller itself. Update = True overwrites the existing Node data.
+    updateNode(polyinterface.Node): Overwrites the existing node data here and on Polyglot.
+    delNode(address): Deletes a Node from the self.nodes/polyglot and ISY. Address is the Node's Address
+    longPoll(): Runs every longPoll seconds (set initially in the server.json or default 10 seconds)
+    shortPoll(): Runs every shortPoll seconds (set initially in the server.json or default 30 seconds)
+    query(): Queries and reports ALL drivers for ALL nodes to the ISY.
+    getDriver('ST'): gets the current value from Polyglot for driver 'ST' returns a STRING, cast as needed
+    runForever(): Easy way to run forever without maxing your CPU or doing some silly 'time.sleep' nonsense
+                  this joins the underlying queue query thread and just waits for it to terminate
+                  which never happens.
+    """
+    def __init__(self, polyglot):
+        """
+        Optional.
+        Super runs all the parent class necessities. You do NOT have
+        to override the __init__ method, but if you do, you MUST call super.
+        """
+        super(NuvoController, self).__init__(polyglot)
+        self.name = 'Nuvo {} Controller'.format(self.model)
+        self.poly.onConfig(self.process_config, sections=('customParams',))
+        self.transport = None
+        self.listener = None
+        self.metrics_server = None
+        # host and port the metrics server was asked to listen on
+        self._metrics_at = None
+        # customParams are only applied on change once start() read them
+        self._params_read = False
+        # start() and process_config() both run from Polyglot's threads
+        self._config_lock = threading.RLock()
+        # check_params defaults, in place before it has read a port
+        self.persistent = True
+        self.pipelined = False
+        self.listen = True
+        self.metrics_host = '127.0.0.1'
+        self.metrics_drivers = False
+        self.cmd_timeout = 15
+        self.breaker_threshold = 3
+        self.breaker_cooldown = 30
+        self.metrics_port = 0
+        self.trace_min_ms = 0
+        self.profile_seconds = 30
+        self.profile_interval = 0.01
+        self._profile_param = None
+        self.poller = PollScheduler(self._poll, busy=self._wire_busy)
+        self.pacer = None
+        self.framing = '8N1'
+        self.zones = {}
+
+    def start(self):
+        """
+        Optional.
+        Polyglot v2 Interface startup done. Here is where you start your integration.
+        This will run, once the NodeServer connects to Polyglot and gets it's config.
+        In this example I am calling a discovery method. While this is optional,
+        this is where you should start. No need to Super this method, the parent
+        version does nothing.
+        """
+        LOGGER.info('Started %s NodeServer', self.name)
+        with self._config_lock:
+            self._params_read = True
+            if False is self.check_params():
+                return False
+            self._serve_metrics()
+            self.discover()
+        # self.poly.add_custom_config_docs("<b>And this is some custom config data</b>")
+
+    def shortPoll(self):
+        """
+        Optional.
+        This runs every 10 seconds. You would probably update your nodes either here
+        or longPoll. No need to Super this method the parent version does nothing.
+        The timer can be overriden in the server.json.
+
+        Zones are polled by self.poller on a schedule of their own, here it
+        is only restarted should it have stopped.
+        """
+        if self.zones and not self.nodesAdding:
+            self.poller.start()
+
+    def longPoll(self):
+        """
+        Optional.
+        This runs every 30 seconds. You would probably update your nodes either here
+        or shortPoll. No need to Super this method the parent version does nothing.
+        The timer can be overriden in the server.json.
+        """
+        if self.transport is not None:
+            LOGGER.info("Transport stats: %s", self.transport.stats())
+        LOGGER.info("Lane stats: %s", self.lanes.stats())
+        LOGGER.info("Poller stats: %s", self.poller.stats())
+        if self.pacer is not None:
+            LOGGER.info("Serial line stats: %s", self.pacer.stats())
+        LOGGER.info("Metrics: %s", metrics.REGISTRY.summary())
+        if self.metrics_drivers:
+            self._report_metrics()
+        if self.fullRefreshDue():
+            # nothing reported lately, resend everything
+            self.reportNodes()
+
+    def query(self):
+        """
+        Optional.
+        By default a query to the control node reports the FULL driver set for ALL
+        nodes back to ISY. If you override this method you will need to Super or
+        issue a reportDrivers() to each node manually.
+        """
+        self.check_params()
+        self.sweep(report=False)
+        self.reportNodes()
+
+    def discover(self, *args, **kwargs):
+        """
+        Add the amp's zones
+        """
+        if self.transport is None:
+            self._connect()
+        for x in range(1, self.zone_count + 1):
+            name = "Zone {}".format(str(x))
+            address = self.zone_address.format(x)
+            LOGGER.info("Adding %s %s and client", name, address)
+            self.zones[x] = self.node_class(self, self.address, address, name, self.transport)
+        # one addnode for all zones, their status is read once Polyglot has
+        # answered for them, see allNodesAdded
+        self.addNodes(list(self.zones.values()))
+        for zone in self.zones.values():
+            self.poller.add(zone.address)
+
+    def allNodesAdded(self):
+        """
+        Status reported for a zone Polyglot has not created yet would be
+        lost, so pushed status, the first sweep and polling start here.
+        """
+        if not self.zones:
+            return
+        self._listen()
+        self.sweep()
+        self.poller.start()
+
+    def _wire_settings(self):
+        return (self.host, self.port, self.persistent, self.pipelined, self.baud, self.framing,
+                self.cmd_timeout, self.breaker_threshold, self.breaker_cooldown)
+
+    def _connect(self):
+        """
+        Build the transport every zone shares, it serializes the wire.
+        """
+        # baud 0 for an amp that is not behind a serial line, e.g. the simulator
+        self.pacer = LinePacer(self.baud, self.framing) if self.baud else None
+        # a wire exchange may take no longer than the command waiting on it
+        client = make_client(self.host, self.port, self.cmd_timeout, self.persistent, self.pipelined,
+                             on_unsolicited=self._route_status, pacer=self.pacer)
+        host, port = self.host, self.port
+        breaker = CircuitBreaker(self.breaker_threshold, self.breaker_cooldown,
+                                 probe=lambda: probe(host, port),
+                                 on_change=self._breaker_changed)
+        self.transport = Transport(client, timeout=self.cmd_timeout, breaker=breaker)
+
+    def _reconnect(self):
+        """
+        Replace the transport after its settings changed. What is already
+        queued on the old one is still sent before it closes.
+        """
+        LOGGER.info("GlobalCache settings changed, reconnecting to %s:%s", self.host, self.port)
+        old = self.transport
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        self._connect()
+        for zone in self.zones.values():
+            zone.client = self.transport
+        # the old breaker must not report on the GlobalCache any more
+        old.breaker.stop()
+        if old.breaker.state != CLOSED:
+            self._breaker_changed(self.transport.breaker.state)
+        old.stop()
+        if self.zones and not self.nodesAdding:
+            self._listen()
+
+    def _listen(self):
+        """
+        Follow pushed status with a listener when `listen` asks for it.
+        """
+        if self.listen and not self.pipelined:
+            if self.listener is None:
+                # the pipelined stream already delivers pushed status, a
+                # persistent client's pooled sockets do once watched
+                client = self.transport.client if self.persistent else None
+                self.listener = StatusListener(self.host, self.port, self._route_status, client=client)
+                self.listener.start()
+        elif self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def _serve_metrics(self):
+        """
+        Start, move or stop the metrics endpoint to match metrics_host and
+        metrics_port.
+        """
+        at = (self.metrics_host, self.metrics_port) if self.metrics_port else None
+        if at == self._metrics_at:
+            return
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        self._metrics_at = at
+        if at is None:
+            return
+        try:
+            self.metrics_server = metrics.MetricsServer(*at).start()
+        except OSError as e:
+            LOGGER.error("Can not serve metrics on %s:%s: %s", self.metrics_host, self.metrics_port, e)
+
+    def sweep(self, zones=None, report=True):
+        """
+        Query every zone in one go over the controller's single connection,
+        set each zone's drivers from its reply and only then report them, so
+        the status updates go out together after the wire work is done.
+        """
+        if self.transport is None:
+            return []
+        zones = list(self.zones.values()) if zones is None else zones
+        try:
+            responses = self.transport.msg_many([zone.query_cmd() for zone in zones])
+        except (ConnectionError, OSError) as e:
+            LOGGER.error("Sweep failed: %s", e)
+            return []
+        updated = [zone for zone, response in zip(zones, responses) if response and zone._set_status(response)]
+        LOGGER.info("Sweep updated %s of %s zones", len(updated), len(zones))
+        if report:
+            self.reportChanges(updated)
+        return updated
+
+    def _poll(self, address):
+        self.nodes[address].poll()
+
+    def _wire_busy(self):
+        """
+        Polls wait while commands are queued for the wire or the GlobalCache
+        is unreachable.
+        """
+        if self.transport is None:
+            return True
+        stats = self.transport.stats()
+        return stats['depth'] > 0 or stats['breaker'] not in (None, CLOSED)
+
+    def _breaker_changed(self, state):
+        """
+        ST on the controller node shows whether the GlobalCache is reachable.
+        """
+        LOGGER.info("GlobalCache circuit breaker %s", state)
+        self.setDriver('ST', 1 if state == CLOSED else 0)
+
+    def _report_metrics(self):
+        """
+        GV1 inbound queue depth, GV2 command latency p90 in ms and GV3 wire
+        errors so far, on the controller node.
+        """
+        p90 = [m.quantile(0.9) for (name, _), m in metrics.REGISTRY.items() if name == 'nuvo_command_seconds']
+        p90 = [q for q in p90 if q is not None]
+        self.setDriver('GV1', self.poly.inQueue.qsize(), False)
+        self.setDriver('GV2', int(max(p90) * 1000) if p90 else 0, False)
+        self.setDriver('GV3', metrics.REGISTRY.total('nuvo_wire_errors_total'), False)
+        self.reportChanges([self])
+
+    def _route_status(self, response):
+        """
+        Status the amp pushed on its own, e.g. after a keypad press. Update
+        the zone it belongs to in place.
+        """
+        node = self.zones.get(res_zone(response))
+        if node is None:
+            LOGGER.debug("Unsolicited status for unknown zone: %s", response)
+            return
+        LOGGER.info("Unsolicited status for %s: %s", node.address, response)
+        if node.address in self.nodesAdding:
+            # kept for the first sweep to report
+            node._set_status(response, used=True)
+            return
+        node._update_status(response, used=True)
+
+    def delete(self):
+        """
+        Example
+        This is sent by Polyglot upon deletion of the NodeServer. If the process is
+        co-resident and controlled by Polyglot, it will be terminiated within 5 seconds
+        of receiving this message.
+        """
+        LOGGER.info('Oh God I\'m being deleted. Nooooooooooooooooooooooooooooooooooooooooo.')
+
+    def stop(self):
+        self.poller.stop()
+        if self.listener is not None:
+            self.listener.stop()
+        if self.transport is not None:
+            self.transport.breaker.stop()
+            self.transport.stop()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        LOGGER.debug('NodeServer stopped.')
+
+    def process_config(self, config):
+        """
+        customParams changed, apply them without a restart. Log, trace,
+        poll, refresh and profile settings take effect as check_params reads
+        them; the metrics endpoint, the listener and the GlobalCache
+        connection are rebuilt if theirs changed.
+        """
+        with self._config_lock:
+            if not self._params_read:
+                # start() has yet to read them
+                return
+            if self.transport is None:
+                # start() gave up, e.g. the port was missing
+                self.start()
+                return
+            wire = self._wire_settings()
+            if False is self.check_params():
+                return
+            self._serve_metrics()
+            if self._wire_settings() != wire:
+                self._reconnect()
+            elif self.zones and not self.nodesAdding:
+                self._listen()
+
+    def _profile(self, *args):
+        """
+        Sample every thread for profile_seconds, or the seconds given with
+        the command, into ./logs.
+        """
+        seconds = self.profile_seconds
+        if args and args[0].get('value'):
+            seconds = number(args[0]['value'], low=0.1)
+            if seconds is None:
+                LOGGER.error('Profile: %s is not a number of seconds', args[0]['value'])
+                return
+        profiler.profile(seconds, self.profile_interval)
+
+    def check_params(self):
+        """
+        todo: get zone assignments from here
+        """
+        LOGGER.info(self.polyConfig)
+        if 'host' in self.polyConfig['customParams']:
+            self.host = self.polyConfig['customParams']['host']
+        else:
+            self.host = '192.168.3.70' # default globalcache
+
+        if 'port' in self.polyConfig['customParams']:
+            self.port = self.polyConfig['customParams']['port']
+        else:
+            LOGGER.error('check_params: port not defined in customParams, please add it.  Using {}')
+            st = False
+            return st
+
+        # per-call sockets remain available with persistent=false
+        self.persistent = str(self.polyConfig['customParams'].get('persistent', 'true')).lower() != 'false'
+        self.pipelined = str(self.polyConfig['customParams'].get('pipelined', 'false')).lower() == 'true'
+        self.listen = str(self.polyConfig['customParams'].get('listen', 'true')).lower() != 'false'
+        self.baud = self._number('baud', type(self).baud, self.baud, int)
+        self.framing = self.polyConfig['customParams'].get('framing', '8N1')
+        try:
+            bits_per_char(self.framing)
+        except ValueError as e:
+            LOGGER.error('check_params: %s, using 8N1', e)
+            self.framing = '8N1'
+        self.cmd_timeout = self._number('timeout', 15, self.cmd_timeout, low=0.1)
+        self.breaker_threshold = self._number('breaker_threshold', 3, self.breaker_threshold, int, low=1)
+        # the probe reconnects once per cooldown
+        self.breaker_cooldown = self._number('breaker_cooldown', 30, self.breaker_cooldown, low=1)
+        self.fullRefresh = self._number('full_refresh', 0, self.fullRefresh)
+        self.metrics_port = self._number('metrics_port', 0, self.metrics_port, int, high=65535)
+        self.metrics_host = self.polyConfig['customParams'].get('metrics_host', '127.0.0.1')
+        self.metrics_drivers = str(self.polyConfig['customParams'].get('metrics_drivers', 'false')).lower() == 'true'
+        polyinterface.set_log_buffer(self.polyConfig['customParams'].get('log_buffer', 500))
+        polyinterface.set_log_level(self.polyConfig['customParams'].get('log_level', 'DEBUG'))
+        trace = str(self.polyConfig['customParams'].get('trace', 'false')).lower() == 'true'
+        self.trace_min_ms = self._number('trace_min_ms', 0, self.trace_min_ms)
+        tracing.configure('./logs/traces.jsonl' if trace else None, self.trace_min_ms)
+        self.poller.configure(active=self._number('poll_active', 30, self.poller.active),
+                              idle=self._number('poll_idle', 300, self.poller.idle),
+                              budget=self._number('poll_budget', 0.1, self.poller.budget, high=1))
+        self.profile_seconds = self._number('profile_seconds', 30, self.profile_seconds, low=0.1)
+        self.profile_interval = self._number('profile_interval_ms', 10, self.profile_interval * 1000, low=1) / 1000
+        # setting or changing `profile` starts one run of that many seconds
+        profile = self.polyConfig['customParams'].get('profile')
+        if profile != self._profile_param:
+            self._profile_param = profile
+            seconds = self._number('profile', 0, 0)
+            if seconds > 0:
+                profiler.profile(seconds, self.profile_interval)
+
+        self.addCustomParam({'host': self.host, 'port': self.port})
+
+    def _number(self, name, default, current, cast=float, low=0, high=None):
+        """
+        customParams[name] as a number, default while it is unset. A value
+        that is not a finite number, or is out of range, is logged and current
+        kept.
+        """
+        value = self.polyConfig['customParams'].get(name)
+        if value is None or str(value).strip() == '':
+            return default
+        result = number(value, cast, low, high)
+        if result is None:
+            LOGGER.error('check_params: %s of %s is not a number in range, keeping %s', name, value, current)
+            return current
+        return result
+
+    """
+    Optional.
+    Since the controller is the parent node in ISY, it will actual show up as a node.
+    So it needs to know the drivers and what id it will use. The drivers are
+    the defaults in the parent Class, so you don't need them unless you want to add to
+    them. The ST and GV1 variables are for reporting status through Polyglot to ISY,
+    DO NOT remove them. UOM 2 is boolean.
+    The id must match the nodeDef id="controller"
+    In the nodedefs.xml
+    """
+    model = None
+    """
+    Model name, in the controller's name.
+    """
+    node_class = None
+    """
+    Node class of the model's zones.
+    """
+    zone_count = 6
+    zone_address = None
+    """
+    Zone address for a zone number, e.g. 'z0{}'.
+    """
+    # the amp's serial port, the GlobalCache must be set to match
+    baud = 9600
+    commands = {
+        'PROFILE': _profile
+    }
+    drivers = [
+        {'driver': 'ST', 'value': 1, 'uom': 2},
+        {'driver': 'GV1', 'value': 0, 'uom': 56}, # inbound queue depth
+        {'driver': 'GV2', 'value': 0, 'uom': 42}, # command p90, ms
+        {'driver': 'GV3', 'value': 0, 'uom': 56}, # wire errors
+    ]
+
+
+class NuvoNode(polyinterface.Node):
+
+    def __init__(self, controller, primary, address, name, client):
+        """
+        Optional.
+        Super runs all the parent class necessities. You do NOT have
+        to override the __init__ method, but if you do, you MUST call super.
+
+        :param controller: Reference to the Controller class
+        :param primary: Controller address
+        :param address: This nodes address
+        :param name: This nodes name
+        """
+        self.address = address
+        self.name = name
+        self.client = client
+        super(NuvoNode, self).__init__(controller, primary, address, name)
+
+    def start(self):
+        # zone status is fetched for every zone at once by the controller's
+        # sweep() at the end of discover()
+        pass
+
+    # percent to int
+    def denormalize_volume(self, val, max=0):
+        new_volume = 79 - int(round(float(val)/100*79,2))
+        return max if max>0 and new_volume>max else "{:0>2}".format(new_volume)
+
+    # int to percent
+    def normalize_volume(self, val, max=0):
+        new_volume = int(round((1 - float(val)/80) * 100,0))
+        return max if max>0 and new_volume>max else "{:0>2}".format(new_volume)
+
+    def parse_status(self, response):
+        status = self.codec.decode(response)
+        if status is False and response not in ("#?", b"#?"):
+            LOGGER.debug('Error parse response on Node %s : %s', self.address, response)
+        return status
+
+    def _volume(self, *args):
+        val = int(args[0]['value'])
+        LOGGER.info('Attempting to set volume %s : %s', self.address, val)
+        if val:
+            return self._send_cmd(self.codec.volume(self.address, val))
+        else:
+            return False
+
+    def _on(self, *args):
+        LOGGER.info(args)
+        success = self._send_cmd(self.codec.encode(self.address, 'ON'))
+        LOGGER.info("_on for %s is success? %s", self.address, success)
+        return success
+
+    def _off(self, *args):
+        LOGGER.info('Recieved DOF command')
+        return self._send_cmd(self.codec.encode(self.address, 'OFF'))
+
+    def _group(self, *args):
+        group = args[0]['value']
+        if group:
+            return self._send_cmd(self.codec.encode(self.address, 'GRP', group))
+        else:
+            return False
+
+    def _source(self, *args):
+        source = args[0]['value']
+        if source and int(source) in range(1,7):
+            return self._send_cmd(self.codec.encode(self.address, 'SRC', source))
+        else:
+            return False
+
+    def _mute(self, *args):
+        mute_on = self.status['GV2']
+        if int(mute_on) == 1:
+            return self._send_cmd(self.codec.encode(self.address, 'MUTEON'))
+        elif int(mute_on) == 0:
+            return self._send_cmd(self.codec.encode(self.address, 'MUTEOFF'))
+        else:
+            return False
+
+    def _send_cmd(self, cmd, priority=COMMAND, full=False):
+        if cmd is None:
+            return False
+        with tracing.span('send_cmd', cmd=cmd):
+            response = self.client.msg(cmd, priority)
+        if response:
+            # anything but a query means the zone is in use
+            return self._update_status(response, used=cmd != self.query_cmd(), full=full)
+        return False
+
+    def _update_status(self, response, used=False, full=False):
+        if self._set_status(response, used):
+            if full:
+                self.reportDrivers()
+            else:
+                # only what the reply changed goes to Polyglot
+                self.reportChanges()
+            return True
+        else:
+            return False
+
+    def _set_status(self, response, used=False):
+        LOGGER.info("parsing response")
+        LOGGER.info(response)
+        self.status = self.parse_status(response)
+        if self.status:
+            for driver,val in self.status.items():
+                LOGGER.info("Set Driver %s : %s", driver, val)
+                self.setDriver(driver, val, False)
+            self.controller.poller.fresh(self.address, self.status['ST'] == 1, used)
+            return True
+        else:
+            return False
+
+    def query_cmd(self):
+        return self.codec.encode(self.address, 'QUERY')
+
+    def query(self, **kwargs):
+        """
+        Asked for by the ISY, which gets every driver back.
+        """
+        self._send_cmd(self.query_cmd(), full=True)
+
+    def poll(self):
+        """
+        Background refresh, behind anything a user asked for.
+        """
+        self._send_cmd(self.query_cmd(), priority=REFRESH)
+
+    drivers = [
+        {'driver': 'ST' , 'value': 0, 'uom': 2}, # st
+        {'driver': 'GV1', 'value': 0, 'uom': 25}, # group
+        {'driver': 'GV2', 'value': 0, 'uom': 2}, # mute
+        {'driver': 'GV3', 'value': 0, 'uom': 25}, # src
+        {'driver': 'GV4', 'value': 0, 'uom': 51} #volume
+    ]
+    """
+    Optional.
+    This is an array of dictionary items containing the variable names(drivers)
+    values and uoms(units of measure) from ISY. This is how ISY knows what kind
+    of variable to display. Check the UOM's in the WSDK for a complete list.
+    UOM 2 is boolean so the ISY will display 'True/False'
+    """
+    codec = None
+    """
+    Shared protocol codec: command templates and status decoding for this model.
+    """
+    id = 'nuvozone'
+    """
+    id of the node from the nodedefs.xml that is in the profile.zip. This tells
+    the ISY what fields and commands this node has.
+    """
+    commands = {
+        'SET_VOL': _volume,
+        'SET_GRP': _group,
+        'SET_SRC': _source,
+        'SET_MT': _mute,
+        'DON': _on,
+        'DOF': _off
+    }
+
+    """
+    This is a dictionary of commands. If ISY sends a command to the NodeServer,
+    this tells it which method to call. DON calls setOn, etc.
+    """
+    coalesce = ('SET_VOL', 'SET_GRP', 'SET_SRC')
+    """
+    Commands where only the newest value matters. One still waiting behind
+    other work for the zone is replaced by a newer one, so a slider drag
+    sends one volume instead of one per step.
+    """
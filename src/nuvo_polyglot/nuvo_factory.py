@@ -9,7 +9,7 @@ class Factory:
         self._nodes[node] = nodeCreator
 
     def get_controller(self, controller):
-        creator = self._nodes.get(controller)
+        creator = self._controllers.get(controller)
         if not creator:
             raise ValueError(controller)
         return creator
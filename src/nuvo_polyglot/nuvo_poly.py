@@ -1,16 +1,17 @@
 #!/usr/bin/env python
+import importlib
 import os
 import sys
-import polyinterface
+import poly_interface as polyinterface
 from nuvo_factory import nuvo_factory
-import concerto
-import essentia
 from dotenv import load_dotenv
 
 if __name__ == "__main__":
     load_dotenv('./.env')
 
     device_type = os.getenv('NUVO_DEVICE').lower()
+    # only the selected driver is loaded, it registers itself with the factory
+    importlib.import_module(device_type)
     polyglot = polyinterface.Interface('Nuvo {} Polyglot'.format(device_type))
     Controller = nuvo_factory.get_controller(device_type.upper())
 
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Pace commands to what the amp's serial line can carry.
+
+The GlobalCache forwards whatever it is sent to a serial port at the amp's
+baud rate, and the amp drops or garbles commands that arrive faster than
+it can take them and answer. LinePacer works out the line time of every
+command plus the reply it will cause, from the baud rate and framing, and
+keeps a schedule of when the line is next free. A send goes out as soon as
+no more than `burst` bytes of line time are still ahead of it:
+
+    pacer = LinePacer(9600, '8N1')
+    time.sleep(pacer.reserve(len(data)))
+
+A client that waits for each reply before the next send rarely waits at
+all; it is pipelined and batched sends that get spread out.
+"""
+
+import logging
+import re
+import threading
+import time
+import metrics
+
+LOGGER = logging.getLogger(__name__)
+
+# data bits, parity, stop bits, e.g. `8N1`, `7E1`, `8N2`
+FRAMING_PAT = re.compile(r'^([5-8])([NEOMS])(1|1\.5|2)$', re.IGNORECASE)
+
+
+def bits_per_char(framing='8N1'):
+    """
+    Bits on the wire per byte: a start bit, the data bits, a parity bit
+    unless N, and the stop bits.
+    """
+    m = FRAMING_PAT.match(str(framing).strip())
+    if m is None:
+        raise ValueError("Unknown serial framing {}".format(framing))
+    return 1 + int(m.group(1)) + (0 if m.group(2).upper() == 'N' else 1) + float(m.group(3))
+
+
+class LinePacer:
+
+    def __init__(self, baud=9600, framing='8N1', burst=0, reply=34):
+        """
+        :param burst: bytes the amp can take ahead of what it has processed
+        :param reply: bytes expected back per command until replies have
+            been seen, `#Z01PWRON,SRC2,GRP0,VOL-62,POFF\\r\\n` is 34
+        """
+        self.baud = int(baud)
+        self.framing = framing
+        self.char_time = bits_per_char(framing) / self.baud
+        self.burst = burst * self.char_time
+        self.reply = float(reply)
+        self.paced = 0
+        self._free = 0.0
+        self._lock = threading.Lock()
+
+    def line_time(self, nbytes):
+        return nbytes * self.char_time
+
+    def reserve(self, nbytes):
+        """
+        Book the line for a send of nbytes and its reply. Returns the seconds
+        to wait before sending.
+        """
+        with self._lock:
+            now = time.time()
+            start = max(now, self._free - self.burst)
+            self._free = max(self._free, start) + self.line_time(nbytes + self.reply)
+            delay = start - now
+            if delay > 0:
+                self.paced += 1
+        metrics.histogram('nuvo_line_wait_seconds').observe(delay)
+        return delay
+
+    def wait(self, nbytes):
+        delay = self.reserve(nbytes)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    def replied(self, nbytes):
+        """
+        Learn the reply size from one that came back, line ending included.
+        """
+        with self._lock:
+            self.reply += (nbytes - self.reply) / 8.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'baud': self.baud,
+                'framing': self.framing,
+                'reply_bytes': round(self.reply, 1),
+                'paced': self.paced,
+                'backlog': round(max(self._free - time.time(), 0), 3),
+            }
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Background zone status polling, spread out and kept off a busy wire.
+
+Each zone is polled once its state is older than its interval: `active`
+seconds while it is on or was used within the last `idle` seconds,
+otherwise `idle`. Anything that brings fresh state (a command reply, a
+status the amp pushed, a sweep) counts, so a zone the listener keeps up to
+date is never polled. Polls are at least active / zones seconds apart, so
+zones that go stale together are spread over the interval, and are held
+back while the wire has other work queued or while polls have used their
+`budget` share of the last `window` seconds of wire time.
+"""
+
+from collections import deque
+import logging
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _Zone:
+
+    __slots__ = ('fresh', 'polled', 'used', 'on')
+
+    def __init__(self, now):
+        self.fresh = now
+        self.polled = 0
+        self.used = 0
+        self.on = False
+
+
+class PollScheduler:
+
+    def __init__(self, poll, busy=None, active=30, idle=300, budget=0.1, window=60, name='Poller'):
+        """
+        :param poll: poll(address) queries one zone, its reply should come
+            back through fresh()
+        :param busy: busy() is True while polls should wait, e.g. commands
+            are queued for the wire
+        """
+        self.poll = poll
+        self.busy = busy
+        self.active = active
+        self.idle = idle
+        self.budget = budget
+        self.window = window
+        self.name = name
+        self.polls = 0
+        self.deferred = 0
+        self._zones = {}
+        self._spent = deque()
+        self._last = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def add(self, address):
+        """
+        Start polling address.
+        """
+        with self._cond:
+            if address not in self._zones:
+                self._zones[address] = _Zone(time.time())
+                self._cond.notify()
+
+    def configure(self, active=None, idle=None, budget=None):
+        with self._cond:
+            if active is not None:
+                self.active = active
+            if idle is not None:
+                self.idle = idle
+            if budget is not None:
+                self.budget = budget
+            self._cond.notify()
+
+    def fresh(self, address, on=None, used=False):
+        """
+        Current state for address just arrived. used marks it as in use,
+        e.g. for a command or a keypad push rather than a plain query.
+        """
+        with self._cond:
+            zone = self._zones.get(address)
+            if zone is None:
+                return
+            zone.fresh = time.time()
+            if on is not None:
+                zone.on = on
+            if used:
+                zone.used = zone.fresh
+            # a zone turned on or used may now be due sooner
+            self._cond.notify()
+
+    def interval(self, address, now=None):
+        zone = self._zones[address]
+        now = time.time() if now is None else now
+        if zone.on or now - zone.used < self.idle:
+            return self.active
+        return self.idle
+
+    def next_poll(self, now):
+        """
+        (address, 0) for the zone to poll now, or (None, seconds) to wait.
+        """
+        if not self.active or not self._zones:
+            return None, 5
+        address, due = None, None
+        for a, zone in self._zones.items():
+            d = max(zone.fresh, zone.polled) + self.interval(a, now)
+            if due is None or d < due:
+                address, due = a, d
+        due = max(due, self._last + float(self.active) / len(self._zones))
+        if self.budget:
+            while self._spent and self._spent[0][0] < now - self.window:
+                self._spent.popleft()
+            spent = sum(seconds for _, seconds in self._spent)
+            if spent >= self.budget * self.window:
+                # wait for the oldest poll to leave the window
+                due = max(due, self._spent[0][0] + self.window)
+        if due > now:
+            return None, due - now
+        return address, 0
+
+    def record(self, address, started, seconds):
+        with self._cond:
+            self._zones[address].polled = started
+            self._last = started
+            self._spent.append((started, seconds))
+            self.polls += 1
+
+    def start(self):
+        """
+        Start the polling thread unless it is running.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            now = time.time()
+            return {
+                'polls': self.polls,
+                'deferred': self.deferred,
+                'wire_seconds': round(sum(s for t, s in self._spent if t >= now - self.window), 3),
+                'intervals': dict((a, self.interval(a, now)) for a in self._zones),
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                address, wait = self.next_poll(time.time())
+                if address is None:
+                    # woken early by add, configure, fresh or stop
+                    self._cond.wait(min(wait, 5))
+                    continue
+            if self.busy is not None and self.busy():
+                with self._cond:
+                    self.deferred += 1
+                    self._cond.wait(1)
+                continue
+            started = time.time()
+            try:
+                self.poll(address)
+            except Exception as e:
+                LOGGER.debug("Poll of %s failed: %s", address, e)
+            self.record(address, started, time.time() - started)
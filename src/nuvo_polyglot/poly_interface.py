@@ -4,28 +4,35 @@ Python Interface for UDI Polyglot v2 NodeServers
 by Einstein.42 (James Milne) milne.james@gmail.com
 """
 
+import atexit
+from collections import OrderedDict, deque
 from copy import deepcopy
 from dotenv import load_dotenv
+import hashlib
+import heapq
+import itertools
 import json
-import ssl
 import logging
 import logging.handlers
 import __main__ as main
-import markdown2
 import os
 from os.path import join, expanduser
 import paho.mqtt.client as mqtt
+import metrics
+import tracing
 try:
     import queue
 except ImportError:
     import Queue as queue
-import re
-import sys
 import select
+import sys
+import threading
 from threading import Thread
 import warnings
 import time
-import netifaces
+
+# when this module was loaded, the start of the clock for startup timings
+STARTED = time.time()
 
 PY2 = sys.version_info[0] == 2
 
@@ -44,8 +51,9 @@ class LoggerWriter(object):
     def write(self, message):
         if isinstance(message, string_types):
             # It's a string !!
-            if not re.match(r'^\s*$', message):
-                self.level(message.strip())
+            message = message.strip()
+            if message:
+                self.level(message)
         else:
             self.level('ERROR: message was not a string: {}'.format(message))
 
@@ -53,6 +61,44 @@ class LoggerWriter(object):
         pass
 
 
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts records on the log queue as they are; the message is only formatted
+    by the writer thread, and only if a handler keeps the record.
+    """
+    def prepare(self, record):
+        return record
+
+
+class RingBufferHandler(logging.Handler):
+    """
+    Keeps the last `capacity` records that were below the log file's level.
+    When an error is logged they are written to the file ahead of it, so the
+    file shows what led up to the error even at a quiet level.
+    """
+    def __init__(self, target, capacity=500):
+        super(RingBufferHandler, self).__init__()
+        self.target = target
+        self.buffer = deque(maxlen=capacity)
+
+    def emit(self, record):
+        if record.levelno < self.target.level:
+            self.buffer.append(record)
+        elif record.levelno >= logging.ERROR:
+            self.dump()
+
+    def dump(self):
+        # only called from emit, so on the writer thread
+        while self.buffer:
+            self.target.handle(self.buffer.popleft())
+
+
+# the modules here import each other by name, so that is their logger name
+PACKAGE_LOGGERS = tuple(sorted(
+    os.path.splitext(name)[0] for name in os.listdir(os.path.dirname(os.path.abspath(__file__)))
+    if name.endswith('.py') and name != '__init__.py'))
+
+
 def setup_log():
     # Log Location
     # path = os.path.dirname(sys.argv[0])
@@ -65,10 +111,7 @@ def setup_log():
     logging.captureWarnings(True)
     logger = logging.getLogger(__name__)
     logger.propagate = False
-    warnlog = logging.getLogger('py.warnings')
     warnings.formatwarning = warning_on_one_line
-    logger.setLevel(log_level)
-    # Set the log level to LOG_LEVEL
     # Make a handler that writes to a file,
     # making a new file at midnight and keeping 3 backups
     handler = logging.handlers.TimedRotatingFileHandler(log_filename, when="midnight", backupCount=3)
@@ -76,11 +119,62 @@ def setup_log():
     formatter = logging.Formatter('%(asctime)s [%(threadName)-10s] [%(levelname)-5s] %(message)s')
     # Attach the formatter to the handler
     handler.setFormatter(formatter)
-    # Attach the handler to the logger
-    logger.addHandler(handler)
-    warnlog.addHandler(handler)
+    # Callers only queue their records, a background thread formats and
+    # writes them. Records for the file's level go to the file, quieter ones
+    # to the ring buffer.
+    global _LOG_FILE, _LOG_RING, _LOG_LISTENER
+    _LOG_FILE = handler
+    _LOG_RING = RingBufferHandler(handler)
+    log_queue = queue.Queue()
+    _LOG_LISTENER = logging.handlers.QueueListener(log_queue, _LOG_RING, handler, respect_handler_level=True)
+    _LOG_LISTENER.start()
+    atexit.register(_LOG_LISTENER.stop)
+    queue_handler = _QueueHandler(log_queue)
+    logger.addHandler(queue_handler)
+    # module loggers (getLogger(__name__)) and py.warnings reach the file
+    # through the root logger, which keeps its own level so other libraries
+    # stay quiet
+    logging.getLogger().addHandler(queue_handler)
+    set_log_level(log_level, logger)
     return logger
 
+
+def set_log_level(level, logger=None):
+    """
+    Level of the log file, a name like 'INFO' or a logging level. Can be
+    changed at any time. Below it, records still go to the ring buffer.
+    """
+    name = level
+    if isinstance(level, string_types):
+        level = logging.getLevelName(level.strip().upper())
+    if not isinstance(level, int):
+        (logger or LOGGER).error('Unknown log level %s, keeping %s', name, logging.getLevelName(_LOG_FILE.level))
+        return
+    _LOG_FILE.setLevel(level)
+    # with a ring buffer every record is kept, otherwise disabled ones are
+    # skipped before they are even built
+    record_level = logging.DEBUG if _LOG_RING.buffer.maxlen else level
+    (logger or LOGGER).setLevel(record_level)
+    for name in PACKAGE_LOGGERS:
+        logging.getLogger(name).setLevel(record_level)
+
+
+def set_log_buffer(capacity, logger=None):
+    """
+    Number of records the ring buffer keeps, 0 to keep none.
+    """
+    try:
+        capacity = int(capacity)
+    except (TypeError, ValueError):
+        (logger or LOGGER).error('Unknown log buffer size %s, keeping %s', capacity, _LOG_RING.buffer.maxlen)
+        return
+    _LOG_RING.acquire()
+    try:
+        _LOG_RING.buffer = deque(_LOG_RING.buffer, maxlen=max(capacity, 0))
+    finally:
+        _LOG_RING.release()
+    set_log_level(_LOG_FILE.level)
+
 LOGGER = setup_log()
 
 
@@ -97,7 +191,7 @@ def init_interface():
     try:
         load_dotenv(join(expanduser("~") + '/.polyglot/.env'))
     except (UserWarning) as err:
-        LOGGER.warning('File does not exist: {}.'.format(join(expanduser("~") + '/.polyglot/.env')), exc_info=True)
+        LOGGER.warning('File does not exist: %s.', join(expanduser("~") + '/.polyglot/.env'), exc_info=True)
         # sys.exit(1)
     warnings.resetwarnings()
 
@@ -108,9 +202,8 @@ def init_interface():
     "mqttHost":"localhost","mqttPort":"1883","profileNum":"10"}
     """
 
-    init = select.select([sys.stdin], [], [], 1)[0]
-    if init:
-        line = sys.stdin.readline()
+    line = read_stdin_config()
+    if line:
         try:
             line = json.loads(line)
             os.environ['PROFILE_NUM'] = line['profileNum']
@@ -123,12 +216,109 @@ def init_interface():
             LOGGER.error('Invalid formatted input. Skipping. %s', err, exc_info=True)
 
 
+# what Polyglot's stdin line carries, see init_interface
+STDIN_CONFIG = ('PROFILE_NUM', 'MQTT_HOST', 'MQTT_PORT', 'TOKEN')
+# seconds to wait for the stdin config, a pipe nobody writes to is given up on
+STDIN_TIMEOUT = 1
+
+
+def read_stdin_config():
+    """
+    The config line Polyglot writes to stdin when it spawns the node server,
+    '' when there is none to read. Skipped when everything it carries is
+    already in the environment or stdin is a terminal; otherwise it is
+    waited for up to STDIN_TIMEOUT seconds, and read as soon as it arrives.
+    """
+    if all(os.environ.get(key) for key in STDIN_CONFIG):
+        return ''
+    try:
+        if sys.stdin is None or sys.stdin.isatty():
+            return ''
+        if not select.select([sys.stdin], [], [], STDIN_TIMEOUT)[0]:
+            LOGGER.debug('No config on stdin after %ss', STDIN_TIMEOUT)
+            return ''
+        return sys.stdin.readline().strip()
+    except (OSError, ValueError, TypeError) as err:
+        # closed, or replaced by something that can not be read
+        LOGGER.debug('No config on stdin: %s', err)
+        return ''
+
+
 def unload_interface():
     sys.stdout = sys.__stdout__
     sys.stderr = sys.__stderr__
+    _LOG_LISTENER.stop()
     LOGGER.handlers = []
 
 
+class InboundQueue(queue.Queue):
+    """
+    Interface.inQueue. Hands out user commands (and results) ahead of
+    queries and status refreshes, and those ahead of polls; within a
+    priority messages keep their arrival order. A poll, query or status
+    request that is already waiting is not queued a second time.
+    """
+    PRIORITY = {'command': 0, 'result': 0, 'delete': 0, 'query': 1, 'status': 1, 'shortPoll': 2, 'longPoll': 2}
+    COLLAPSE = ('query', 'status', 'shortPoll', 'longPoll')
+
+    def _init(self, maxsize):
+        self.queue = []
+        self.collapsed = 0
+        self._count = itertools.count()
+        self._waiting = set()
+
+    def _qsize(self):
+        return len(self.queue)
+
+    def _put(self, item):
+        key = self._collapseKey(item)
+        if key is not None:
+            self._waiting.add(key)
+        heapq.heappush(self.queue, (self._priority(item), next(self._count), time.time(), item, tracing.current()))
+
+    def _get(self):
+        """
+        The trace the message was put with becomes current on the getting
+        thread.
+        """
+        _, _, queued, item, trace = heapq.heappop(self.queue)
+        self._waiting.discard(self._collapseKey(item))
+        metrics.histogram('nuvo_inbound_wait_seconds').observe(time.time() - queued)
+        if trace is not None:
+            trace.add('inbound_wait', queued)
+        tracing.set_current(trace)
+        return item
+
+    def __init__(self):
+        super(InboundQueue, self).__init__()
+
+    def put(self, item, block=True, timeout=None):
+        """
+        Queue.put, with the check for a waiting duplicate made under the
+        same lock as the insert. The queue is unbounded, put never blocks.
+        """
+        with self.not_full:
+            key = self._collapseKey(item)
+            if key is not None and key in self._waiting:
+                self.collapsed += 1
+                return
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+
+    def _priority(self, item):
+        return min([self.PRIORITY.get(key, 0) for key in item] or [0])
+
+    def _collapseKey(self, item):
+        if len(item) != 1:
+            return None
+        key = next(iter(item))
+        if key not in self.COLLAPSE:
+            return None
+        value = item[key]
+        return (key, value.get('address') if isinstance(value, dict) else None)
+
+
 class Interface(object):
 
     CUSTOM_CONFIG_DOCS_FILE_NAME = 'POLYGLOT_CONFIG.md'
@@ -174,6 +364,7 @@ class Interface(object):
         if 'USE_HTTPS' in os.environ:
             self.useSecure = os.environ['USE_HTTPS']
         if self.useSecure is True:
+            import ssl
             if 'MQTT_CERTPATH' in os.environ:
                 self._mqttc.tls_set(
                     ca_certs=os.environ['MQTT_CERTPATH'] + '/polyglot.crt',
@@ -192,7 +383,9 @@ class Interface(object):
         self.config = None
         # self.loop = asyncio.new_event_loop()
         self.loop = None
-        self.inQueue = queue.Queue()
+        self.inQueue = InboundQueue()
+        metrics.gauge('nuvo_inbound_depth', self.inQueue.qsize)
+        metrics.gauge('nuvo_inbound_collapsed', lambda: self.inQueue.collapsed)
         # self.thread = Thread(target=self.start_loop)
         self.isyVersion = None
         self._server = os.environ.get("MQTT_HOST") or 'localhost'
@@ -203,17 +396,50 @@ class Interface(object):
         Interface.__exists = True
         self.custom_params_docs_file_sent = False
         self.custom_params_pending_docs = ''
-        try:
-            self.network_interface = self.get_network_interface()
-            LOGGER.info('Connect: Network Interface: {}'.format(self.network_interface))
-        except:
-            LOGGER.error('Failed to determine Network Interface', exc_info=True)
+        self.features = set(f for f in os.environ.get('POLYGLOT_FEATURES', '').split(',') if f)
+        # config['nodes'] keyed by address, and their driver values keyed by
+        # address and driver, rebuilt on every config
+        self._nodeIndex = {}
+        self._driverIndex = {}
+        # digests of each config section, and of the customParams Polyglot
+        # has or was last sent, so unchanged ones are skipped
+        self._configDigests = {}
+        self._customParamsDigest = None
+        self._networkInterface = None
+        # seconds from STARTED to each startup milestone
+        self.startup = {}
+        self.markStartup('interface')
+
+    @property
+    def network_interface(self):
+        """
+        Looked up on first use, most node servers never need it.
+        """
+        if self._networkInterface is None:
+            try:
+                self._networkInterface = self.get_network_interface()
+                LOGGER.info('Connect: Network Interface: %s', self._networkInterface)
+            except:
+                LOGGER.error('Failed to determine Network Interface', exc_info=True)
+        return self._networkInterface
 
-    def onConfig(self, callback):
+    def markStartup(self, milestone):
+        """
+        Record (once) how long after startup a milestone was reached.
+        """
+        if milestone not in self.startup:
+            self.startup[milestone] = round(time.time() - STARTED, 3)
+            LOGGER.info('Startup: %s after %ss', milestone, self.startup[milestone])
+
+    def onConfig(self, callback, sections=None):
         """
         Gives the ability to bind any methods to be run when the config is received.
+
+        :param sections: Top level config keys (e.g. 'customParams', 'nodes') the
+                         callback cares about. It then only runs when one of them
+                         changed. None runs it whenever anything changed.
         """
-        self.__configObservers.append(callback)
+        self.__configObservers.append((callback, sections))
 
     def onStop(self, callback):
         """
@@ -272,7 +498,7 @@ class Interface(object):
                     return
                 del parsed_msg['node']
                 for key in parsed_msg:
-                    # LOGGER.debug('MQTT Received Message: {}: {}'.format(msg.topic, parsed_msg))
+                    # LOGGER.debug('MQTT Received Message: %s: %s', msg.topic, parsed_msg)
                     if key == 'config':
                         self.inConfig(parsed_msg[key])
                     elif key == 'connected':
@@ -281,12 +507,13 @@ class Interface(object):
                         LOGGER.debug('Received stop from Polyglot... Shutting Down.')
                         self.stop()
                     elif key in inputCmds:
-                        self.input(parsed_msg)
+                        with tracing.activate(tracing.start(key)):
+                            self.input(parsed_msg)
                     else:
-                        LOGGER.error('Invalid command received in message from Polyglot: {}'.format(key))
+                        LOGGER.error('Invalid command received in message from Polyglot: %s', key)
 
         except (ValueError) as err:
-            LOGGER.error('MQTT Received Payload Error: {}'.format(err), exc_info=True)
+            LOGGER.error('MQTT Received Payload Error: %s', err, exc_info=True)
 
     def _disconnect(self, mqttc, userdata, rc):
         """
@@ -310,17 +537,17 @@ class Interface(object):
 
     def _log(self, mqttc, userdata, level, string):
         """ Use for debugging MQTT Packets, disable for normal use, NOISY. """
-        # LOGGER.info('MQTT Log - {}: {}'.format(str(level), str(string)))
+        # LOGGER.info('MQTT Log - %s: %s', str(level), str(string))
         pass
 
     def _subscribe(self, mqttc, userdata, mid, granted_qos):
         """ Callback for Subscribe message. Unused currently. """
-        # LOGGER.info("MQTT Subscribed Succesfully for Message ID: {} - QoS: {}".format(str(mid), str(granted_qos)))
+        # LOGGER.info("MQTT Subscribed Succesfully for Message ID: %s - QoS: %s", str(mid), str(granted_qos))
         pass
 
     def _publish(self, mqttc, userdata, mid):
         """ Callback for publish message. Unused currently. """
-        # LOGGER.info("MQTT Published message ID: {}".format(str(mid)))
+        # LOGGER.info("MQTT Published message ID: %s", str(mid))
         pass
 
     def start(self):
@@ -332,7 +559,7 @@ class Interface(object):
         The client start method. Starts the thread for the MQTT Client
         and publishes the connected message.
         """
-        LOGGER.info('Connecting to MQTT... {}:{}'.format(self._server, self._port))
+        LOGGER.info('Connecting to MQTT... %s:%s', self._server, self._port)
         done = False
         while not done:
             try:
@@ -347,7 +574,7 @@ class Interface(object):
             except Exception as ex:
                 template = "An exception of type {0} occurred. Arguments:\n{1!r}"
                 message = template.format(type(ex).__name__, ex.args)
-                LOGGER.error("MQTT Connection error: {}".format(message), exc_info=True)
+                LOGGER.error("MQTT Connection error: %s", message, exc_info=True)
                 done = True
 
     def stop(self):
@@ -361,7 +588,7 @@ class Interface(object):
         # self._longPoll.cancel()
         # self._shortPoll.cancel()
         if self.connected:
-            LOGGER.info('Disconnecting from MQTT... {}:{}'.format(self._server, self._port))
+            LOGGER.info('Disconnecting from MQTT... %s:%s', self._server, self._port)
             self._mqttc.publish(self.topicSelfConnection, json.dumps({'node': self.profileNum, 'connected': False}), retain=True)
             self._mqttc.loop_stop()
             self._mqttc.disconnect()
@@ -380,10 +607,26 @@ class Interface(object):
             warnings.warn('payload not a dictionary')
             return False
         try:
+            metrics.counter('nuvo_mqtt_sent_total', kind=next(iter(message), '')).inc()
             message['node'] = self.profileNum
             self._mqttc.publish(self.topicInput, json.dumps(message), retain=False)
         except TypeError as err:
-            LOGGER.error('MQTT Send Error: {}'.format(err), exc_info=True)
+            metrics.counter('nuvo_mqtt_send_errors_total').inc()
+            LOGGER.error('MQTT Send Error: %s', err, exc_info=True)
+
+    def sendStatuses(self, statuses):
+        """
+        Send several driver updates. They go out as one status message when
+        Polyglot accepts batches, otherwise as one message per driver.
+
+        :param statuses: List of dictionaries with address, driver, value and uom.
+        """
+        with tracing.span('report', statuses=len(statuses)):
+            if len(statuses) > 1 and self.supports_feature('batchstatus'):
+                self.send({'status': statuses})
+            else:
+                for status in statuses:
+                    self.send({'status': status})
 
     def addNode(self, node):
         """
@@ -391,7 +634,16 @@ class Interface(object):
 
         :param node: Dictionary of node settings. Keys: address, name, node_def_id, primary, and drivers are required.
         """
-        LOGGER.info('Adding node {}({})'.format(node.name, node.address))
+        self.addNodes([node])
+
+    def addNodes(self, nodes):
+        """
+        Add several nodes to the NodeServer in one addnode message.
+
+        :param nodes: List of nodes, see addNode.
+        """
+        for node in nodes:
+            LOGGER.info('Adding node %s(%s)', node.name, node.address)
         message = {
             'addnode': {
                 'nodes': [{
@@ -399,9 +651,9 @@ class Interface(object):
                     'name': node.name,
                     'node_def_id': node.id,
                     'primary': node.primary,
-                    'drivers': node.drivers,
+                    'drivers': node.drivers.toList(),
                     'hint': node.hint
-                }]
+                } for node in nodes]
             }
         }
         self.send(message)
@@ -422,7 +674,12 @@ class Interface(object):
 
         :param data: Dictionary of key value pairs to store in Polyglot database.
         """
+        digest = self._digest(data)
+        if digest == self._customParamsDigest:
+            LOGGER.debug('customParams unchanged, not sending.')
+            return
         LOGGER.info('Sending customParams to Polyglot.')
+        self._customParamsDigest = digest
         message = { 'customparams': data }
         self.send(message)
 
@@ -432,7 +689,7 @@ class Interface(object):
 
         :param data: String of characters to add as a notification in the front-end.
         """
-        LOGGER.info('Sending addnotice to Polyglot: {}'.format(data))
+        LOGGER.info('Sending addnotice to Polyglot: %s', data)
         message = { 'addnotice': data }
         self.send(message)
 
@@ -442,7 +699,7 @@ class Interface(object):
 
         :param data: Index of notices list to remove.
         """
-        LOGGER.info('Sending removenotice to Polyglot for index {}'.format(data))
+        LOGGER.info('Sending removenotice to Polyglot for index %s', data)
         message = { 'removenotice': data }
         self.send(message)
 
@@ -467,7 +724,7 @@ class Interface(object):
 
         :param node: Dictionary of node settings. Keys: address, name, node_def_id, primary, and drivers are required.
         """
-        LOGGER.info('Removing node {}'.format(address))
+        LOGGER.info('Removing node %s', address)
         message = {
             'removenode': {
                 'address': address
@@ -479,14 +736,23 @@ class Interface(object):
         """
         Get Node by Address of existing nodes.
         """
-        try:
-            for node in self.config['nodes']:
-                if node['address'] == address:
-                    return node
-            return False
-        except KeyError:
-            LOGGER.error('Usually means we have not received the config yet.', exc_info=True)
+        if self.config is None:
+            LOGGER.error('Usually means we have not received the config yet.')
             return False
+        return self._nodeIndex.get(address, False)
+
+    def getDriverValue(self, address, driver):
+        """
+        Value Polyglot has stored for a node's driver, None if unknown.
+        """
+        return self._driverIndex.get(address, {}).get(driver)
+
+    def _indexConfig(self, config):
+        nodes = config.get('nodes', [])
+        self._nodeIndex = dict((node['address'], node) for node in nodes)
+        self._driverIndex = dict(
+            (node['address'], dict((d['driver'], d['value']) for d in node.get('drivers', [])))
+            for node in nodes)
 
     def inConfig(self, config):
         """
@@ -495,24 +761,49 @@ class Interface(object):
         """
         self.config = config
         self.isyVersion = config['isyVersion']
+        self.markStartup('config')
+        self.features.update(config.get('features', []))
+        digests = dict((key, self._digest(value)) for key, value in config.items())
+        changed = set(key for key in set(digests) | set(self._configDigests)
+                      if digests.get(key) != self._configDigests.get(key))
+        self._configDigests = digests
+        if 'customParams' in digests:
+            self._customParamsDigest = digests['customParams']
+        if not changed:
+            LOGGER.debug('Config unchanged.')
+            return
+        if 'nodes' in changed:
+            self._indexConfig(config)
         try:
-            for watcher in self.__configObservers:
-                watcher(config)
+            for watcher, sections in self.__configObservers:
+                if sections is None or changed.intersection(sections):
+                    watcher(config)
 
             self.send_custom_config_docs()
 
         except KeyError as e:
-            LOGGER.error('KeyError in gotConfig: {}'.format(e), exc_info=True)
+            LOGGER.error('KeyError in gotConfig: %s', e, exc_info=True)
 
     def input(self, command):
         self.inQueue.put(command)
 
+    @staticmethod
+    def _digest(value):
+        return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+    # features Polyglot has to announce, in config['features'] or the
+    # POLYGLOT_FEATURES environment variable, before they are used
+    OPT_IN_FEATURES = ('batchstatus',)
+
     def supports_feature(self, feature):
+        if feature in Interface.OPT_IN_FEATURES:
+            return feature in self.features
         return True
 
     def get_md_file_data(self, fileName):
         data = ''
         if os.path.isfile(fileName):
+            import markdown2
             data = markdown2.markdown_path(fileName)
 
         return data
@@ -571,19 +862,136 @@ class Interface(object):
     """
     def get_network_interface(self,interface='default'):
         # Get the default gateway
+        import netifaces
         gws = netifaces.gateways()
-        LOGGER.debug("gws: {}".format(gws))
+        LOGGER.debug("gws: %s", gws)
         rt = False
         if interface in gws:
             gwd = gws[interface][netifaces.AF_INET]
-            LOGGER.debug("gw: {}={}".format(interface,gwd))
+            LOGGER.debug("gw: %s=%s", interface, gwd)
             ifad = netifaces.ifaddresses(gwd[1])
             rt = ifad[netifaces.AF_INET]
-            LOGGER.debug("ifad: {}={}".format(gwd[1],rt))
+            LOGGER.debug("ifad: %s=%s", gwd[1], rt)
             return rt[0]
-        LOGGER.error("No {} in gateways:{}".format(interface,gws))
+        LOGGER.error("No %s in gateways:%s", interface, gws)
         return {'addr': False, 'broadcast': False, 'netmask': False}
 
+class _Driver(object):
+    """
+    One driver of a node: its current value and uom and the value and uom
+    last reported to Polyglot.
+    """
+    __slots__ = ('value', 'uom', 'reported', 'reportedUom')
+
+    def __init__(self, value, uom):
+        self.value = self.reported = value
+        self.uom = self.reportedUom = uom
+
+    def changed(self):
+        return str(self.reported) != str(self.value) or self.reportedUom != self.uom
+
+    def markReported(self):
+        self.reported = self.value
+        self.reportedUom = self.uom
+
+
+class DriverTable(object):
+    """
+    A node's drivers keyed by driver name, in the order they were declared.
+    Iterating or toList() gives the list of dictionaries Polyglot expects.
+    Lane workers, pollers and listeners update the same table, so reads and
+    writes go through its lock.
+    """
+    __slots__ = ('_entries', '_lock')
+
+    def __init__(self, drivers=()):
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        for d in drivers:
+            self._entries[d['driver']] = _Driver(d['value'], d['uom'])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, driver):
+        return driver in self._entries
+
+    def __iter__(self):
+        return iter(self.toList())
+
+    def get(self, driver):
+        return self._entries.get(driver)
+
+    def set(self, driver, value, uom=None):
+        """
+        Set a driver's current value, and uom unless None. False if the
+        node has no such driver.
+        """
+        with self._lock:
+            d = self._entries.get(driver)
+            if d is None:
+                return False
+            d.value = value
+            if uom is not None:
+                d.uom = uom
+            return True
+
+    def toList(self):
+        with self._lock:
+            return [{'driver': name, 'value': d.value, 'uom': d.uom} for name, d in self._entries.items()]
+
+    def statuses(self, address):
+        with self._lock:
+            return [{'address': address, 'driver': name, 'value': d.value, 'uom': d.uom}
+                    for name, d in self._entries.items()]
+
+    def change(self, address, driver, force=False):
+        """
+        Status dictionary for one driver if it differs from what was last
+        reported (or force), which is then marked as reported. None if not.
+        """
+        with self._lock:
+            d = self._entries.get(driver)
+            if d is None or not (force or d.changed()):
+                return None
+            d.markReported()
+            return {'address': address, 'driver': driver, 'value': str(d.value), 'uom': d.uom}
+
+    def changes(self, address, force=False):
+        """
+        Status dictionaries for the drivers whose value or uom differs from
+        what was last reported (every driver with force), which are marked
+        as reported.
+        """
+        statuses = []
+        with self._lock:
+            for name, d in self._entries.items():
+                if force or d.changed():
+                    d.markReported()
+                    statuses.append({'address': address, 'driver': name, 'value': str(d.value), 'uom': d.uom})
+        return statuses
+
+    def markReported(self):
+        with self._lock:
+            for d in self._entries.values():
+                d.markReported()
+
+    def loadReported(self, drivers, values=False):
+        """
+        Take the values and uoms Polyglot has stored (a list of dictionaries)
+        as the last reported ones. With values the stored values also become
+        the current ones.
+        """
+        with self._lock:
+            for stored in drivers:
+                d = self._entries.get(stored['driver'])
+                if d is not None:
+                    d.reported = stored['value']
+                    d.reportedUom = stored['uom']
+                    if values:
+                        d.value = stored['value']
+
+
 class Node(object):
     """
     Node Class for individual devices.
@@ -596,15 +1004,14 @@ class Node(object):
             self.address = address
             self.name = name
             self.polyConfig = None
-            self.drivers = deepcopy(self.drivers)
-            self._drivers = deepcopy(self.drivers)
+            self.drivers = DriverTable(self.drivers)
             self.isPrimary = None
             self.config = None
             self.timeAdded = None
             self.enabled = None
             self.added = None
         except (KeyError) as err:
-            LOGGER.error('Error Creating node: {}'.format(err), exc_info=True)
+            LOGGER.error('Error Creating node: %s', err, exc_info=True)
 
     def _convertDrivers(self, drivers):
         return deepcopy(drivers)
@@ -621,35 +1028,16 @@ class Node(object):
         """
 
     def setDriver(self, driver, value, report=True, force=False, uom=None):
-        for d in self.drivers:
-            if d['driver'] == driver:
-                d['value'] = value
-                if uom is not None:
-                    d['uom'] = uom
-                if report:
-                    self.reportDriver(d, report, force)
-                break
+        if self.drivers.set(driver, value, uom) and report:
+            self.reportDriver(driver, report, force)
 
     def reportDriver(self, driver, report, force):
-        for d in self._drivers:
-            if (d['driver'] == driver['driver'] and
-                    (str(d['value']) != str(driver['value']) or
-                     d['uom'] != driver['uom'] or
-                     force)):
-                LOGGER.info('Updating Driver {} - {}: {}, uom: {}'.format(self.address, driver['driver'], driver['value'], driver['uom']))
-                d['value'] = deepcopy(driver['value'])
-                if d['uom'] != driver['uom']:
-                    d['uom'] = deepcopy(driver['uom'])
-                message = {
-                    'status': {
-                        'address': self.address,
-                        'driver': driver['driver'],
-                        'value': str(driver['value']),
-                        'uom': driver['uom']
-                    }
-                }
-                self.controller.poly.send(message)
-                break
+        if isinstance(driver, dict):
+            driver = driver['driver']
+        status = self.drivers.change(self.address, driver, force)
+        if status is not None:
+            LOGGER.info('Updating Driver %(address)s - %(driver)s: %(value)s, uom: %(uom)s', status)
+            self.controller.poly.send({'status': status})
 
     def reportCmd(self, command, value=None, uom=None):
         message = {
@@ -664,21 +1052,35 @@ class Node(object):
         self.controller.poly.send(message)
 
     def reportDrivers(self):
-        LOGGER.info('Updating All Drivers to ISY for {}({})'.format(self.name, self.address))
-        self.updateDrivers(self.drivers)
-        for driver in self.drivers:
-            message = {
-                'status': {
-                    'address': self.address,
-                    'driver': driver['driver'],
-                    'value': driver['value'],
-                    'uom': driver['uom']
-                }
-            }
-            self.controller.poly.send(message)
+        LOGGER.info('Updating All Drivers to ISY for %s(%s)', self.name, self.address)
+        self.controller.poly.sendStatuses(self.drivers.changes(self.address, force=True))
+
+    def driverStatuses(self):
+        return self.drivers.statuses(self.address)
+
+    def changedStatuses(self):
+        """
+        Status dictionaries for the drivers that differ from what was last
+        reported, compared the way reportDriver does. They are marked as
+        reported.
+        """
+        statuses = self.drivers.changes(self.address)
+        for status in statuses:
+            LOGGER.info('Updating Driver %(address)s - %(driver)s: %(value)s, uom: %(uom)s', status)
+        return statuses
+
+    def reportChanges(self):
+        self.controller.reportChanges([self])
 
     def updateDrivers(self, drivers):
-        self._drivers = deepcopy(drivers)
+        """
+        Take drivers (a DriverTable, or the list Polyglot keeps for the
+        node) as what was last reported.
+        """
+        if isinstance(drivers, DriverTable):
+            self.drivers.loadReported(drivers.toList())
+        else:
+            self.drivers.loadReported(drivers)
 
     def query(self):
         self.reportDrivers()
@@ -689,18 +1091,21 @@ class Node(object):
     def runCmd(self, command):
         if command['cmd'] in self.commands:
             fun = self.commands[command['cmd']]
-            fun(self, command)
+            start = time.time()
+            try:
+                with tracing.span('runCmd', address=self.address, cmd=command['cmd']):
+                    fun(self, command)
+            except Exception:
+                metrics.counter('nuvo_command_errors_total', cmd=command['cmd']).inc()
+                raise
+            finally:
+                metrics.histogram('nuvo_command_seconds', cmd=command['cmd']).observe(time.time() - start)
 
     def start(self):
         pass
 
     def getDriver(self, dv):
-        for index, node in enumerate(self.controller.poly.config['nodes']):
-            if node['address'] == self.address:
-                for index, driver in enumerate(node['drivers']):
-                    if driver['driver'] == dv:
-                        return driver['value']
-        return None
+        return self.controller.poly.getDriverValue(self.address, dv)
 
     def toJSON(self):
         LOGGER.debug(json.dumps(self.__dict__))
@@ -710,11 +1115,170 @@ class Node(object):
 
     id = ''
     commands = {}
+    # commands where only the newest value matters, see Controller._supersedeKey
+    coalesce = ()
     drivers = []
     sends = {}
     hint = [ 0, 0, 0, 0 ]
 
 
+class LaneDispatcher(object):
+    """
+    Runs work for different node addresses concurrently while keeping the
+    work for each address in order. Every address has its own lane (a FIFO)
+    and at most `workers` lanes run at a time. submit() blocks once
+    `maxPending` items are waiting, which holds back whoever feeds it.
+    Work submitted with a key replaces the last item waiting in its lane if
+    that has the same key, so a burst of settings only runs the newest; the
+    replaced item's args and trace go to onSuperseded(args, trace).
+    After stop() nothing more is run, and every item still waiting goes to
+    onDropped(args, trace).
+    """
+
+    def __init__(self, workers=4, maxPending=64, name='Lane', onSuperseded=None, onDropped=None):
+        self.workers = workers
+        self.maxPending = maxPending
+        self.onSuperseded = onSuperseded
+        self.onDropped = onDropped
+        self._cond = threading.Condition()
+        self._lanes = {}
+        # addresses waiting for a worker
+        self._ready = deque()
+        # addresses that are ready or running
+        self._busy = set()
+        self._pending = 0
+        self._maxDepth = {}
+        self._served = {}
+        self._superseded = 0
+        self._dropped = 0
+        self._stopped = False
+        self._threads = [Thread(target=self._work, name='{}-{}'.format(name, n), daemon=True)
+                         for n in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, address, fn, *args, **kwargs):
+        """
+        Queue fn(*args) on address's lane, or with key= in place of the
+        lane's last waiting item if it has that key. False once stopped.
+        """
+        key = kwargs.get('key')
+        with self._cond:
+            while self._pending >= self.maxPending and not self._stopped:
+                self._cond.wait()
+            if self._stopped:
+                return False
+            lane = self._lanes.setdefault(address, deque())
+            item = (fn, args, tracing.current(), time.time(), key)
+            if key is not None and lane and lane[-1][4] == key:
+                # not started, workers only take items under this lock
+                replaced = lane[-1]
+                lane[-1] = item
+                self._superseded += 1
+            else:
+                replaced = None
+                lane.append(item)
+                self._pending += 1
+            self._maxDepth[address] = max(self._maxDepth.get(address, 0), len(lane))
+            if address not in self._busy:
+                self._busy.add(address)
+                self._ready.append(address)
+                self._cond.notify_all()
+        if replaced is not None:
+            _, args, trace, queued, _ = replaced
+            if trace is not None:
+                trace.add('lane_wait', queued, lane=address, superseded=True)
+            if self.onSuperseded is not None:
+                self.onSuperseded(args, trace)
+        return True
+
+    def waitForRoom(self):
+        """
+        Block until submit() would not.
+        """
+        with self._cond:
+            while self._pending >= self.maxPending and not self._stopped:
+                self._cond.wait()
+
+    def join(self, timeout=None):
+        """
+        Wait until everything submitted so far has run. False on timeout.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout=2):
+        """
+        Drop the work that has not started and end the workers once they
+        finish what they are running. False if one is still busy after
+        timeout seconds.
+        """
+        dropped = []
+        with self._cond:
+            self._stopped = True
+            for lane in self._lanes.values():
+                self._dropped += len(lane)
+                self._pending -= len(lane)
+                dropped.extend(lane)
+                lane.clear()
+            self._ready.clear()
+            self._cond.notify_all()
+        if self.onDropped is not None:
+            for _, args, trace, _, _ in dropped:
+                self.onDropped(args, trace)
+        # a delete from Polyglot stops us from one of our own workers
+        others = [thread for thread in self._threads if thread is not threading.current_thread()]
+        deadline = time.time() + timeout
+        for thread in others:
+            thread.join(max(deadline - time.time(), 0))
+        return not any(thread.is_alive() for thread in others)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'pending': self._pending,
+                'superseded': self._superseded,
+                'dropped': self._dropped,
+                'lanes': dict((address, {
+                    'depth': len(lane),
+                    'max_depth': self._maxDepth.get(address, 0),
+                    'served': self._served.get(address, 0),
+                }) for address, lane in self._lanes.items()),
+            }
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._ready and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                address = self._ready.popleft()
+                fn, args, trace, queued, _ = self._lanes[address].popleft()
+            if trace is not None:
+                trace.add('lane_wait', queued, lane=address)
+            try:
+                with tracing.activate(trace):
+                    fn(*args)
+            except Exception as err:
+                LOGGER.error('Lane %s failed: %s', address, err, exc_info=True)
+            with self._cond:
+                self._pending -= 1
+                self._served[address] = self._served.get(address, 0) + 1
+                if self._lanes[address]:
+                    # back of the line, so one busy address can not starve the rest
+                    self._ready.append(address)
+                else:
+                    self._busy.discard(address)
+                self._cond.notify_all()
+
+
 class Controller(Node):
     """
     Controller Class for controller management. Superclass of Node
@@ -734,7 +1298,7 @@ class Controller(Node):
             self.name = name
             self.address = 'controller'
             self.primary = self.address
-            self._drivers = deepcopy(self.drivers)
+            self.drivers = DriverTable(self.drivers)
             self._nodes = {}
             self.config = None
             self.nodes = { self.address: self }
@@ -748,10 +1312,18 @@ class Controller(Node):
             self.added = None
             self.started = False
             self.nodesAdding = []
+            # seconds between forced full reports, 0 to only report changes
+            self.fullRefresh = 0
+            self._lastFullReport = time.time()
+            # inbound work runs in one lane per node address
+            self.lanes = LaneDispatcher(self.laneWorkers, self.lanePending, onSuperseded=self._superseded,
+                                        onDropped=self._dropped)
+            self.poly.onStop(self.lanes.stop)
+            metrics.gauge('nuvo_lane_pending', lambda: self.lanes.stats()['pending'])
             # self._threads = []
             self._startThreads()
         except (KeyError) as err:
-            LOGGER.error('Error Creating node: {}'.format(err), exc_info=True)
+            LOGGER.error('Error Creating node: %s', err, exc_info=True)
 
     def _gotConfig(self, config):
         self.polyConfig = config
@@ -780,51 +1352,126 @@ class Controller(Node):
         self._threads['input'].start()
 
     def _parseInput(self):
+        """
+        Hand each inbound message to the lane of the node it is for, so a
+        slow zone only holds up its own commands. Messages for no particular
+        node (polls, query all, results) share the controller's lane.
+        Messages are only taken off inQueue while the lanes have room, so
+        backed up work waits there, where commands go first.
+        """
         while True:
+            self.lanes.waitForRoom()
             input = self.poly.inQueue.get()
-            for key in input:
-                if key == 'command':
-                    if input[key]['address'] in self.nodes:
-                        try:
-                            self.nodes[input[key]['address']].runCmd(input[key])
-                        except (Exception) as err:
-                            LOGGER.error('_parseInput: failed {}.runCmd({}) {}'.format(input[key]['address'], input[key]['cmd'], err), exc_info=True)
-                    else:
-                        LOGGER.error('_parseInput: received command {} for a node that is not in memory: {}'.format(input[key]['cmd'], input[key]['address']))
-                elif key == 'result':
-                    self._handleResult(input[key])
-                elif key == 'delete':
-                    self._delete()
-                elif key == 'shortPoll':
-                    self.shortPoll()
-                elif key == 'longPoll':
-                    self.longPoll()
-                elif key == 'query':
-                    if input[key]['address'] in self.nodes:
-                        self.nodes[input[key]['address']].query()
-                    elif input[key]['address'] == 'all':
-                        self.query()
-                elif key == 'status':
-                    if input[key]['address'] in self.nodes:
-                        self.nodes[input[key]['address']].status()
-                    elif input[key]['address'] == 'all':
-                        self.status()
+            address = self._laneFor(input)
+            if not self.lanes.submit(address, self._runInput, input, key=self._supersedeKey(address, input)):
+                # stopping, it will not be handled
+                self.poly.inQueue.task_done()
+
+    def _laneFor(self, input):
+        for key in ('command', 'query', 'status'):
+            if key in input and input[key].get('address') in self.nodes:
+                return input[key]['address']
+        return self.address
+
+    def _supersedeKey(self, address, input):
+        """
+        A command listed in its node's `coalesce` is replaced by a newer one
+        of the same kind that arrives while it still waits in the lane.
+        """
+        if len(input) != 1 or 'command' not in input:
+            return None
+        cmd = input['command'].get('cmd')
+        node = self.nodes.get(address)
+        if node is None or cmd not in node.coalesce:
+            return None
+        return (address, cmd)
+
+    def _superseded(self, args, trace):
+        input = args[0]
+        LOGGER.debug('Superseded %s', input)
+        metrics.counter('nuvo_superseded_total', cmd=input['command']['cmd']).inc()
+        if trace is not None:
+            trace.finish()
+        self.poly.inQueue.task_done()
+
+    def _dropped(self, args, trace):
+        LOGGER.debug('Dropped %s on stop', args[0])
+        if trace is not None:
+            trace.finish()
+        self.poly.inQueue.task_done()
+
+    def _runInput(self, input):
+        start = time.time()
+        try:
+            self._handleInput(input)
+        finally:
+            metrics.histogram('nuvo_inbound_seconds', kind=next(iter(input), '')).observe(time.time() - start)
+            trace = tracing.current()
+            if trace is not None:
+                trace.add('handle', start)
+                trace.finish()
             self.poly.inQueue.task_done()
 
+    def _handleInput(self, input):
+        for key in input:
+            if key == 'command':
+                if input[key]['address'] in self.nodes:
+                    try:
+                        self.nodes[input[key]['address']].runCmd(input[key])
+                        self.poly.markStartup('first_command')
+                    except (Exception) as err:
+                        LOGGER.error('_parseInput: failed %s.runCmd(%s) %s', input[key]['address'], input[key]['cmd'], err, exc_info=True)
+                else:
+                    LOGGER.error('_parseInput: received command %s for a node that is not in memory: %s', input[key]['cmd'], input[key]['address'])
+            elif key == 'result':
+                self._handleResult(input[key])
+            elif key == 'delete':
+                self._delete()
+            elif key == 'shortPoll':
+                self.shortPoll()
+            elif key == 'longPoll':
+                self.longPoll()
+            elif key == 'query':
+                if input[key]['address'] in self.nodes:
+                    self.nodes[input[key]['address']].query()
+                elif input[key]['address'] == 'all':
+                    self.query()
+            elif key == 'status':
+                if input[key]['address'] in self.nodes:
+                    self.nodes[input[key]['address']].status()
+                elif input[key]['address'] == 'all':
+                    self.status()
+
     def _handleResult(self, result):
         # LOGGER.debug(self.nodesAdding)
-        try:
-            if 'addnode' in result:
-                if result['addnode']['success']:
-                    if not result['addnode']['address'] == self.address:
-                        self.nodes[result['addnode']['address']].start()
-                    # self.nodes[result['addnode']['address']].reportDrivers()
-                    if result['addnode']['address'] in self.nodesAdding:
-                        self.nodesAdding.remove(result['addnode']['address'])
+        if 'addnode' not in result:
+            return
+        # a batched addnode may be answered with one result per node
+        added = result['addnode']
+        if isinstance(added, dict):
+            added = added.get('nodes', [added])
+        waiting = len(self.nodesAdding)
+        for res in added:
+            try:
+                if res['address'] in self.nodesAdding:
+                    self.nodesAdding.remove(res['address'])
+                if res['success']:
+                    if not res['address'] == self.address:
+                        self.nodes[res['address']].start()
+                    # self.nodes[res['address']].reportDrivers()
                 else:
-                    del self.nodes[result['addnode']['address']]
-        except (KeyError, ValueError) as err:
-            LOGGER.error('handleResult: {}'.format(err), exc_info=True)
+                    del self.nodes[res['address']]
+            except (KeyError, ValueError) as err:
+                LOGGER.error('handleResult: %s', err, exc_info=True)
+        if waiting and not self.nodesAdding:
+            self.allNodesAdded()
+
+    def allNodesAdded(self):
+        """
+        Polyglot has answered for every node added so far, so status for any
+        of them can now be reported.
+        """
+        pass
 
     def _delete(self):
         """
@@ -859,21 +1506,23 @@ class Controller(Node):
     If update is True, overwrite the node in Polyglot
     """
     def addNode(self, node, update=False):
-        if node.address in self._nodes:
-            node._drivers = self._nodes[node.address]['drivers']
-            for driver in node.drivers:
-                for existing in self._nodes[node.address]['drivers']:
-                    if driver['driver'] == existing['driver']:
-                        driver['value'] = existing['value']
-                        # JIMBO SAYS NO
-                        # driver['uom'] = existing['uom']
-        self.nodes[node.address] = node
-        # if node.address not in self._nodes or update:
-        self.nodesAdding.append(node.address)
-        self.poly.addNode(node)
+        return self.addNodes([node], update)[0]
+
+    """
+    AddNodes does the same for several nodes with a single request to Polyglot
+    """
+    def addNodes(self, nodes, update=False):
+        for node in nodes:
+            if node.address in self._nodes:
+                # start from the values Polyglot has stored, but keep our uoms
+                node.drivers.loadReported(self._nodes[node.address]['drivers'], values=True)
+            self.nodes[node.address] = node
+            # if node.address not in self._nodes or update:
+            self.nodesAdding.append(node.address)
+        self.poly.addNodes(nodes)
         # else:
         #    self.nodes[node.address].start()
-        return node
+        return nodes
 
     """
     Forces a full overwrite of the node
@@ -906,6 +1555,38 @@ class Controller(Node):
         for node in self.nodes:
             self.nodes[node].reportDrivers()
 
+    def reportNodes(self, nodes=None):
+        """
+        Report all drivers of several nodes together, as a single message
+        when Polyglot accepts batches. With nodes None every node is
+        reported and the full refresh timer starts over.
+        """
+        if nodes is None:
+            nodes = list(self.nodes.values())
+            self._lastFullReport = time.time()
+        statuses = []
+        for node in nodes:
+            LOGGER.info('Updating All Drivers to ISY for %s(%s)', node.name, node.address)
+            statuses.extend(node.drivers.changes(node.address, force=True))
+        self.poly.sendStatuses(statuses)
+
+    def reportChanges(self, nodes):
+        """
+        Report only the drivers of nodes whose value or uom changed since
+        they were last reported. Once fullRefresh seconds have passed since
+        the last full report, every driver of every node goes out instead.
+        """
+        if self.fullRefreshDue():
+            return self.reportNodes()
+        statuses = []
+        for node in nodes:
+            statuses.extend(node.changedStatuses())
+        if statuses:
+            self.poly.sendStatuses(statuses)
+
+    def fullRefreshDue(self):
+        return self.fullRefresh > 0 and time.time() - self._lastFullReport >= self.fullRefresh
+
     def runForever(self):
         self._threads['input'].join()
 
@@ -922,7 +1603,7 @@ class Controller(Node):
         if not isinstance(data, dict):
             LOGGER.error('addCustomParam: data isn\'t a dictionary. Ignoring.')
         else:
-            newData = self.poly.config['customParams']
+            newData = dict(self.poly.config['customParams'])
             newData.update(data)
             self.poly.saveCustomParams(newData)
 
@@ -939,11 +1620,11 @@ class Controller(Node):
                 newData.pop(data)
                 self.poly.saveCustomParams(newData)
             except KeyError:
-                LOGGER.error('{} not found in customParams. Ignoring...'.format(data), exc_info=True)
+                LOGGER.error('%s not found in customParams. Ignoring...', data, exc_info=True)
 
     def getCustomParam(self, data):
-        params = deepcopy(self.poly.config['customParams'])
-        return params.get(data)
+        # values are strings, nothing to copy
+        return self.poly.config['customParams'].get(data)
 
     def addNotice(self, data, key=None):
         if not isinstance(data, dict):
@@ -978,6 +1659,10 @@ class Controller(Node):
     id = 'controller'
     commands = {}
     drivers = [{'driver': 'ST', 'value': 0, 'uom': 2}]
+    # worker threads for inbound lanes, and how many messages may wait in
+    # them before the input reader stops taking more off inQueue
+    laneWorkers = 4
+    lanePending = 8
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+On-demand sampling profiler covering every thread of the node server.
+
+While running it samples sys._current_frames() every interval seconds and
+counts each thread's stack. When the window ends the counts are written in
+the collapsed format flamegraph.pl and speedscope read, one stack per line
+with the thread name first:
+
+    Controller;poly_interface.py:_parseInput;queue.py:get 812
+
+and the busiest stacks are logged. Samples are wall clock, so a thread
+waiting on a lock or socket shows up where it waits.
+"""
+
+from collections import Counter
+import logging
+import os
+import sys
+import threading
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+
+    def __init__(self, interval=0.01, depth=40):
+        self.interval = interval
+        self.depth = depth
+        self.samples = Counter()
+        self.path = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds, path):
+        """
+        Profile for seconds and write the result to path. False if a profile
+        is already running.
+        """
+        if self.running:
+            LOGGER.warning("Profiler already running, writing to %s", self.path)
+            return False
+        self.samples = Counter()
+        self.path = path
+        self._thread = threading.Thread(target=self._run, args=(time.time() + seconds,), name='Profiler', daemon=True)
+        self._thread.start()
+        LOGGER.info("Profiling all threads for %ss every %sms", seconds, self.interval * 1000)
+        return True
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def sample(self):
+        me = threading.get_ident()
+        names = dict((t.ident, t.name) for t in threading.enumerate())
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.depth:
+                code = frame.f_code
+                stack.append('{}:{}'.format(os.path.basename(code.co_filename), code.co_name))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join('{} {}\n'.format(stack, n) for stack, n in sorted(self.samples.items()))
+
+    def top(self, count=10):
+        """
+        The count most sampled stacks as (stack, share of samples).
+        """
+        total = float(sum(self.samples.values())) or 1
+        return [(stack, n / total) for stack, n in self.samples.most_common(count)]
+
+    def _run(self, deadline):
+        rounds = 0
+        while time.time() < deadline:
+            self.sample()
+            rounds += 1
+            time.sleep(self.interval)
+        directory = os.path.dirname(self.path)
+        try:
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+            with open(self.path, 'w') as f:
+                f.write(self.collapsed())
+        except OSError as e:
+            LOGGER.error("Can not write profile to %s: %s", self.path, e)
+            return
+        LOGGER.info("Profile of %s rounds written to %s", rounds, self.path)
+        for stack, share in self.top():
+            LOGGER.info("Profile %5.1f%% %s", share * 100, stack)
+
+
+PROFILER = SamplingProfiler()
+
+
+def profile(seconds, interval=None, directory='./logs'):
+    """
+    Start PROFILER for seconds, writing to a timestamped file in directory.
+    """
+    if interval and not PROFILER.running:
+        PROFILER.interval = interval
+    path = os.path.join(directory, time.strftime('profile-%Y%m%d-%H%M%S.txt'))
+    return PROFILER.start(seconds, path)
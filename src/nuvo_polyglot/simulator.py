@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for a Nuvo amp behind a GlobalCache serial port.
+
+Speaks the Essentia and Concerto ASCII commands the way essentia.py and
+concerto.py use them, keeps per-zone state, and can add serial-line
+latency, jitter, dropped replies and unsolicited keypad events. Point the
+node server's `host`/`port` custom params at it:
+
+    python simulator.py --model essentia --port 4999 --latency 0.02 --keypad 10
+"""
+
+import argparse
+import logging
+import random
+import re
+import socketserver
+import threading
+import time
+
+CMD_PAT = re.compile(r'^\*Z0?([0-9]+)(ON|OFF|VOL([0-9]+)|SRC([0-9])|GRP([0-9])|MTON|MTOFF|MUTEON|MUTEOFF|CONSR|STATUS\?)$')
+
+# commands each model understands, anything else is answered with `#?`
+MODEL_CMDS = {
+    'essentia': ('ON', 'OFF', 'VOL', 'SRC', 'GRP', 'MTON', 'MTOFF', 'CONSR'),
+    'concerto': ('ON', 'OFF', 'VOL', 'SRC', 'MUTEON', 'MUTEOFF', 'STATUS?'),
+}
+
+
+class Zone:
+
+    def __init__(self):
+        self.power = False
+        self.source = 1
+        self.group = 0
+        self.volume = 40
+        self.mute = False
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        sim = self.server.simulator
+        self.lock = threading.Lock()
+        sim._clients.add(self)
+        try:
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    break
+                line = line.strip().decode(errors='replace')
+                if not line:
+                    continue
+                reply = sim.exchange(line)
+                if reply is not None:
+                    self.push(reply)
+        except OSError:
+            pass
+        finally:
+            sim._clients.discard(self)
+
+    def push(self, line):
+        with self.lock:
+            self.wfile.write("{}\r\n".format(line).encode())
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class NuvoSimulator:
+    """
+    Per-zone Nuvo state behind a TCP port. Commands from every connected
+    client share one simulated serial line, so they are answered one at a
+    time, each after `latency` +/- `jitter` seconds. `drop` is the chance a
+    reply is lost; with `keypad` set, a random zone changes every `keypad`
+    seconds and its status is pushed to all clients.
+    """
+
+    def __init__(self, model='essentia', host='127.0.0.1', port=0, zones=6,
+                 latency=0.0, jitter=0.0, drop=0.0, keypad=0, seed=None):
+        if model not in MODEL_CMDS:
+            raise ValueError(model)
+        self.model = model
+        self.zones = dict((x, Zone()) for x in range(1, zones + 1))
+        self.latency = latency
+        self.jitter = jitter
+        self.drop = drop
+        self.keypad = keypad
+        self.random = random.Random(seed)
+        self.commands = 0
+        self.dropped = 0
+        self._line = threading.Lock()
+        self._clients = set()
+        self._stopped = threading.Event()
+        self._server = _Server((host, port), _Handler)
+        self._server.simulator = self
+        self.host, self.port = self._server.server_address
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='Simulator', daemon=True).start()
+        if self.keypad:
+            threading.Thread(target=self._keypad_loop, name='Keypad', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def exchange(self, line):
+        """
+        One command over the simulated serial line. Returns the reply, or
+        None when the reply is dropped.
+        """
+        with self._line:
+            self.commands += 1
+            delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+            if delay > 0:
+                time.sleep(delay)
+            reply = self.handle(line)
+            if self.drop and self.random.random() < self.drop:
+                self.dropped += 1
+                return None
+            return reply
+
+    def handle(self, line):
+        if line.upper() == '*ALLOFF':
+            for zone in self.zones.values():
+                zone.power = False
+            return '#ALLOFF'
+        m = CMD_PAT.match(line.upper())
+        if not m or int(m.group(1)) not in self.zones:
+            return '#?'
+        n, cmd = int(m.group(1)), m.group(2)
+        if not cmd.startswith(MODEL_CMDS[self.model]):
+            return '#?'
+        zone = self.zones[n]
+        if cmd == 'ON':
+            zone.power = True
+        elif cmd == 'OFF':
+            zone.power = False
+        elif cmd.startswith('VOL'):
+            zone.volume = min(int(m.group(3)), 79)
+            zone.mute = False
+        elif cmd.startswith('SRC'):
+            zone.source = int(m.group(4))
+        elif cmd.startswith('GRP'):
+            zone.group = int(m.group(5))
+        elif cmd in ('MTON', 'MUTEON'):
+            zone.mute = True
+        elif cmd in ('MTOFF', 'MUTEOFF'):
+            zone.mute = False
+        return self.status(n)
+
+    def status(self, n):
+        zone = self.zones[n]
+        if self.model == 'essentia':
+            if not zone.power:
+                return '#Z{:0>2}PWROFF'.format(n)
+            return '#Z{:0>2}PWRON,SRC{},GRP{},VOL-{},POFF'.format(
+                n, zone.source, zone.group, 'MT' if zone.mute else '{:0>2}'.format(zone.volume))
+        if not zone.power:
+            return '#Z{},OFF'.format(n)
+        return '#Z{},ON,SRC{},VOL{},DND0,LOCK0'.format(
+            n, zone.source, 'MUTE' if zone.mute else '{:0>2}'.format(zone.volume))
+
+    def keypad_event(self, n=None):
+        """
+        Someone used a keypad: change a zone and push its status.
+        """
+        n = n or self.random.choice(list(self.zones))
+        zone = self.zones[n]
+        action = self.random.choice(('power', 'volume', 'source'))
+        if action == 'power':
+            zone.power = not zone.power
+        elif action == 'volume':
+            zone.power = True
+            zone.volume = self.random.randint(0, 79)
+        else:
+            zone.power = True
+            zone.source = self.random.randint(1, 6)
+        status = self.status(n)
+        for client in list(self._clients):
+            try:
+                client.push(status)
+            except OSError:
+                self._clients.discard(client)
+        return status
+
+    def _keypad_loop(self):
+        while not self._stopped.wait(self.keypad):
+            self.keypad_event()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Nuvo amp / GlobalCache simulator')
+    parser.add_argument('--model', choices=sorted(MODEL_CMDS), default='essentia')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=4999)
+    parser.add_argument('--zones', type=int, default=6)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per reply on the serial line')
+    parser.add_argument('--jitter', type=float, default=0.0, help='+/- seconds added to latency')
+    parser.add_argument('--drop', type=float, default=0.0, help='probability a reply is lost')
+    parser.add_argument('--keypad', type=float, default=0, help='seconds between unsolicited keypad events')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    sim = NuvoSimulator(args.model, args.host, args.port, args.zones, args.latency,
+                        args.jitter, args.drop, args.keypad, args.seed).start()
+    logging.info("Simulating Nuvo {} with {} zones on {}:{}".format(args.model, args.zones, sim.host, sim.port))
+    try:
+        while True:
+            time.sleep(60)
+            logging.info("{} commands, {} replies dropped".format(sim.commands, sim.dropped))
+    except KeyboardInterrupt:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Request tracing from the inbound MQTT message to the amp and back out as
+status publishes.
+
+Interface._message starts a Trace per message. Each thread hand-off (the
+inbound queue, the node lanes, the transport worker) carries it along and
+makes it current on the next thread, and the stages record timed spans
+on it. When the message has been handled the trace is finished and, if
+tracing is configured, written as one JSON line:
+
+    {"trace": "3f2a...", "kind": "command", "ms": 41.2,
+     "spans": [{"name": "inbound_wait", "at_ms": 0.0, "ms": 0.1}, ...]}
+
+With tracing off start() returns None and span() does nothing.
+"""
+
+from contextlib import contextmanager
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+LOGGER = logging.getLogger(__name__)
+
+_local = threading.local()
+_exporter = None
+
+
+class Trace:
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex[:16]
+        self.kind = kind
+        self.start = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name, start, end=None, **attrs):
+        span = {'name': name, 'at_ms': _ms(start - self.start), 'ms': _ms((end or time.time()) - start)}
+        span.update(attrs)
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self):
+        exporter = _exporter
+        if exporter is not None:
+            exporter.export(self)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s['at_ms'])
+        return {'trace': self.id, 'kind': self.kind, 'start': round(self.start, 6),
+                'ms': _ms(time.time() - self.start), 'spans': spans}
+
+
+class FileExporter:
+    """
+    Appends finished traces slower than min_ms to path as JSON lines, from a
+    background thread.
+    """
+
+    def __init__(self, path, min_ms=0):
+        self.path = path
+        self.min_ms = min_ms
+        self._queue = queue.Queue()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        threading.Thread(target=self._run, name='Traces', daemon=True).start()
+
+    def export(self, trace):
+        self._queue.put(trace.to_dict())
+
+    def stop(self):
+        self._queue.put(None)
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            if record['ms'] < self.min_ms:
+                continue
+            try:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+            except OSError as e:
+                LOGGER.error("Can not write trace to %s: %s", self.path, e)
+
+
+def configure(path=None, min_ms=0):
+    """
+    Start writing traces to path, or stop tracing with path None.
+    """
+    global _exporter
+    previous = _exporter
+    if path is None:
+        _exporter = None
+    elif previous is None or previous.path != path:
+        _exporter = FileExporter(path, min_ms)
+        LOGGER.info("Writing traces to %s", path)
+    else:
+        previous.min_ms = min_ms
+        return
+    if previous is not None:
+        previous.stop()
+
+
+def enabled():
+    return _exporter is not None
+
+
+def start(kind):
+    return Trace(kind) if _exporter is not None else None
+
+
+def current():
+    return getattr(_local, 'trace', None)
+
+
+def set_current(trace):
+    _local.trace = trace
+
+
+@contextmanager
+def activate(trace):
+    """
+    Make trace current on this thread for the duration of the block.
+    """
+    previous = current()
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time the block as a span of the current trace, if there is one.
+    """
+    trace = current()
+    if trace is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        trace.add(name, start, **attrs)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3)
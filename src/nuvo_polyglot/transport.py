@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+import itertools
+import logging
+import queue
+import socket
+import threading
+import time
+import metrics
+import tracing
+from breaker import CircuitOpenError
+from global_cache import GlobalCache
+
+LOGGER = logging.getLogger(__name__)
+
+# wire work priorities, lowest first: what a user asked for goes ahead of
+# sweeps and polls
+COMMAND, REFRESH = 0, 1
+
+
+def make_client(host, port, timeout=10, persistent=True, pipelined=False, on_unsolicited=None, pacer=None):
+    """
+    Build the GlobalCache client selected by the controller's custom params.
+    """
+    if pipelined:
+        # asyncio is only loaded when the pipelined client is used
+        from async_global_cache import PipelinedGlobalCache
+        return PipelinedGlobalCache(host, port, timeout, on_unsolicited, pacer)
+    return GlobalCache(host, port, timeout, persistent=persistent, on_unsolicited=on_unsolicited, pacer=pacer)
+
+
+def probe(host, port, timeout=5):
+    """
+    Circuit breaker probe: just check the GlobalCache accepts a connection.
+    """
+    socket.create_connection((host, int(port)), timeout).close()
+
+
+def _error_kind(e):
+    if isinstance(e, socket.timeout):
+        return 'timeout'
+    if isinstance(e, ConnectionRefusedError):
+        return 'refused'
+    return 'error'
+
+
+class _Request:
+
+    def __init__(self, cmds, batch=False, timeout=None, priority=COMMAND):
+        self.cmds = cmds
+        self.batch = batch
+        self.priority = priority
+        self.queued = time.time()
+        self.deadline = self.queued + timeout if timeout else None
+        self.future = Future()
+        # the submitting thread's trace, the worker adds its spans to it
+        self.trace = tracing.current()
+
+
+class Transport:
+    """
+    Single owner of the wire for one controller.
+
+    Zone nodes hand their commands to msg()/msg_many() exactly as they would
+    to a GlobalCache; the commands are queued and a single worker thread puts
+    them on the wire one request at a time, so zones no longer compete for
+    the GlobalCache's one serial session. Queue depth and time spent waiting
+    for the wire are tracked and available from stats().
+
+    Requests are taken by priority, then in order. A batch sent command by
+    command lets anything more urgent that was queued meanwhile go between
+    its commands, so a user command waits for at most one sweep or poll
+    exchange.
+
+    Every request has a deadline of `timeout` seconds covering both the wait
+    for the wire and the exchange itself; callers get socket.timeout when it
+    passes and expired requests are never sent. With a CircuitBreaker,
+    requests fail fast with CircuitOpenError while the device is unreachable.
+    """
+
+    def __init__(self, client, name='Transport', timeout=15, breaker=None):
+        self.client = client
+        self.timeout = timeout
+        self.breaker = breaker
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._served = 0
+        self._max_depth = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_last = 0.0
+        metrics.gauge('nuvo_transport_depth', self._queue.qsize, transport=name)
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, cmd, priority=COMMAND):
+        """
+        Queue cmd and return a Future for the reply.
+        """
+        return self._put(_Request([cmd], timeout=self.timeout, priority=priority))
+
+    def msg(self, msg, priority=COMMAND):
+        return self._wait(self.submit(msg, priority), msg)
+
+    def msg_many(self, msgs, priority=REFRESH):
+        """
+        Queue several commands as one unit of wire work. Pipelining clients
+        get them in one msg_many call, others in order. Returns the replies
+        in order, False in place of any that failed.
+        """
+        msgs = list(msgs)
+        # a batch gets the deadline of each of its commands in turn
+        timeout = self.timeout * len(msgs) if self.timeout else None
+        return self._wait(self._put(_Request(msgs, batch=True, timeout=timeout, priority=priority)), msgs, timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'depth': self._queue.qsize(),
+                'max_depth': self._max_depth,
+                'served': self._served,
+                'wait_last': round(self._wait_last, 3),
+                'wait_avg': round(self._wait_total / self._served, 3) if self._served else 0.0,
+                'wait_max': round(self._wait_max, 3),
+                'breaker': self.breaker.state if self.breaker else None,
+            }
+
+    def stop(self):
+        """
+        Serve what is already queued, then close the client. Requests past
+        their deadline are dropped rather than sent, which bounds the wait.
+        """
+        self._queue.put((float('inf'), next(self._seq), None))
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _wait(self, future, msg, timeout=None):
+        try:
+            return future.result(timeout or self.timeout)
+        except FutureTimeout:
+            future.cancel()
+            LOGGER.error("Transport deadline passed for %s", msg)
+            raise socket.timeout
+
+    def _put(self, request):
+        with self._lock:
+            self._queue.put((request.priority, next(self._seq), request))
+            depth = self._queue.qsize()
+            self._max_depth = max(self._max_depth, depth)
+        if depth > 1:
+            LOGGER.debug("Transport queue depth %s submitting %s", depth, request.cmds)
+        return request.future
+
+    def _run(self):
+        while True:
+            _, _, request = self._queue.get()
+            if request is None:
+                break
+            self._serve(request)
+        if hasattr(self.client, 'close'):
+            self.client.close()
+
+    def _serve_before(self, priority):
+        """
+        Serve whatever is queued ahead of priority, e.g. user commands that
+        came in during a sweep.
+        """
+        while True:
+            with self._queue.mutex:
+                head = self._queue.queue[0] if self._queue.queue else None
+            if head is None or head[0] >= priority:
+                return
+            # the only taker is this thread, so head or better is next
+            self._serve(self._queue.get()[2])
+
+    def _serve(self, request):
+        waited = time.time() - request.queued
+        with self._lock:
+            self._served += 1
+            self._wait_last = waited
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        metrics.histogram('nuvo_transport_wait_seconds').observe(waited)
+        if request.trace is not None:
+            request.trace.add('transport_wait', request.queued, depth=self._queue.qsize())
+        if not request.future.set_running_or_notify_cancel():
+            return
+        if request.deadline is not None and time.time() > request.deadline:
+            metrics.counter('nuvo_wire_errors_total', kind='expired').inc()
+            request.future.set_exception(socket.timeout())
+            return
+        if self.breaker is not None and not self.breaker.allow():
+            metrics.counter('nuvo_wire_errors_total', kind='breaker_open').inc()
+            request.future.set_exception(CircuitOpenError("GlobalCache unreachable, breaker is {}".format(self.breaker.state)))
+            return
+        start = time.time()
+        error = None
+        try:
+            result = self._execute(request)
+        except (socket.error, RuntimeError) as e:
+            error, kind = e, _error_kind(e)
+            if self.breaker is not None:
+                self.breaker.failure()
+        except Exception as e:
+            error, kind = e, 'error'
+        # before the future resolves, the caller may finish the trace then
+        if request.trace is not None:
+            request.trace.add('wire', start, cmds=request.cmds, result=kind if error else 'ok')
+        if error is not None:
+            metrics.counter('nuvo_wire_errors_total', kind=kind).inc()
+            request.future.set_exception(error)
+            return
+        metrics.histogram('nuvo_wire_seconds', batch=request.batch).observe(time.time() - start)
+        for reply in (result if request.batch else [result]):
+            # False is `#?`, or a failed command inside a batch
+            metrics.counter('nuvo_wire_replies_total', result='ok' if reply else 'rejected').inc()
+        if self.breaker is not None and (not request.batch or any(result)):
+            self.breaker.success()
+        request.future.set_result(result)
+
+    def _execute(self, request):
+        if not request.batch:
+            return self.client.msg(request.cmds[0])
+        if getattr(self.client, 'pipelined', False):
+            # all in flight at once, nothing to let in between
+            return self.client.msg_many(request.cmds)
+        results = []
+        for cmd in request.cmds:
+            self._serve_before(request.priority)
+            try:
+                results.append(self.client.msg(cmd))
+            except Exception as e:
+                LOGGER.error("Transport failed sending %s: %s", cmd, e)
+                results.append(False)
+        return results
@@ -7,5 +7,25 @@
     Read more about conftest.py under:
     https://pytest.org/latest/plugins.html
 """
+import os
+import sys
+import tempfile
+
+# the node server runs flat out of its install dir, so modules import each
+# other by bare name; mirror that here
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src', 'nuvo_polyglot'))
+
+# poly_interface starts logging to ./logs when imported, keep that out of the
+# tree; with the Polyglot settings in the environment an Interface neither
+# waits on stdin nor loads certificates
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp())
+try:
+    import poly_interface  # noqa: F401
+finally:
+    os.chdir(_cwd)
+for key, value in (('PROFILE_NUM', '1'), ('MQTT_HOST', 'localhost'), ('MQTT_PORT', '1883'),
+                   ('TOKEN', 'test'), ('USE_HTTPS', 'false')):
+    os.environ.setdefault(key, value)
 
 # import pytest
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import socket
+import threading
+from unittest import TestCase
+from async_global_cache import PipelinedGlobalCache, res_zone, cmd_zone
+
+__author__ = "brett.hale"
+__copyright__ = "brett.hale"
+__license__ = "mit"
+
+
+def reversed_amp(server, batch):
+    """
+    Collect `batch` commands, push one keypad line, then answer the commands
+    last to first so replies only line up if they are matched by zone.
+    """
+    conn, _ = server.accept()
+    with conn:
+        buf = b''
+        while buf.count(b'\r\n') < batch:
+            buf += conn.recv(64)
+        cmds = [c.decode() for c in buf.split(b'\r\n') if c]
+        out = b'#Z05PWRON,SRC1,GRP0,VOL-40,POFF\r\n'
+        for cmd in reversed(cmds):
+            out += '#Z{}PWROFF\r\n'.format(cmd[2:4]).encode()
+        conn.sendall(out)
+        conn.recv(64)
+
+
+class TestPipelined(TestCase):
+
+    def test_zone_parsing(self):
+        assert cmd_zone('*Z01CONSR') == 1
+        assert cmd_zone('*Z3STATUS?') == 3
+        assert res_zone('#Z3,ON,SRC1,VOL44,DND0,LOCK0') == 3
+        assert res_zone('#Z12PWROFF') == 12
+        assert res_zone('#?') is None
+
+    def test_replies_matched_by_zone(self):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        threading.Thread(target=reversed_amp, args=(server, 3), daemon=True).start()
+
+        pushed = []
+        gc = PipelinedGlobalCache('127.0.0.1', server.getsockname()[1], 2, on_unsolicited=pushed.append)
+        results = gc.msg_many(['*Z01OFF', '*Z02OFF', '*Z03OFF'])
+        assert results == ['#Z01PWROFF', '#Z02PWROFF', '#Z03PWROFF']
+        assert pushed == ['#Z05PWRON,SRC1,GRP0,VOL-40,POFF']
+        gc.close()
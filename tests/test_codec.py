@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+from codec import NuvoCodec, ESSENTIA_SPEC, CONCERTO_SPEC
+
+__author__ = "brett.hale"
+__copyright__ = "brett.hale"
+__license__ = "mit"
+
+
+class TestEssentia(TestCase):
+
+    def setUp(self):
+        self.codec = NuvoCodec(ESSENTIA_SPEC)
+
+    def test_decode_on(self):
+        status = self.codec.decode(b'#Z01PWRON,SRC2,GRP0,VOL-62,POFF')
+        assert status == {'ST': 1, 'GV1': 0, 'GV2': 0, 'GV3': 2, 'GV4': '22'}
+
+    def test_decode_muted(self):
+        status = self.codec.decode('#Z02PWRON,SRC1,GRP3,VOL-MT,POFF')
+        assert status == {'ST': 1, 'GV1': 3, 'GV2': 1, 'GV3': 1}
+
+    def test_decode_off(self):
+        assert self.codec.decode('#Z01PWROFF') == {'ST': 0}
+
+    def test_decode_malformed(self):
+        assert self.codec.decode('#?') is False
+        assert self.codec.decode('') is False
+        assert self.codec.decode(None) is False
+        assert self.codec.decode(b'\xff\xfe') is False
+        assert self.codec.decode('#Z01PWRON,SRC2,GR') == {'ST': 1}
+
+    def test_encode(self):
+        assert self.codec.encode('z01', 'ON') == '*Z01ON'
+        assert self.codec.encode('z01', 'QUERY') == '*Z01CONSR'
+        assert self.codec.encode('z01', 'MUTEON') == '*Z01MTON'
+        assert self.codec.encode('z01', 'GRP', 2) == '*Z01GRP2'
+        assert self.codec.volume('z01', 100) == '*Z01VOL00'
+        assert self.codec.volume('z01', 50) == '*Z01VOL40'
+
+
+class TestConcerto(TestCase):
+
+    def setUp(self):
+        self.codec = NuvoCodec(CONCERTO_SPEC)
+
+    def test_decode(self):
+        assert self.codec.decode('#Z3,ON,SRC1,VOL44,DND0,LOCK0') == {'ST': 1, 'GV1': 0, 'GV2': 0, 'GV3': 1, 'GV4': '45'}
+        assert self.codec.decode('#Z12,ON,SRC4,VOLMUTE,DND0,LOCK0') == {'ST': 1, 'GV1': 0, 'GV2': 1, 'GV3': 4}
+        assert self.codec.decode('#Z3,OFF') == {'ST': 0}
+        assert self.codec.zone('#Z12,OFF') == 12
+
+    def test_encode(self):
+        assert self.codec.encode('Z3', 'QUERY') == '*Z3STATUS?'
+        assert self.codec.encode('Z3', 'MUTEOFF') == '*Z3MUTEOFF'
+        assert self.codec.encode('Z3', 'GRP', 1) is None
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import json
+import re
+import time
+from types import SimpleNamespace
+from unittest import TestCase
+from unittest.mock import patch
+from essentia import EssentiaController, EssentiaNode
+from simulator import NuvoSimulator
+from test_poly_interface import make_config, make_interface
+
+__author__ = "brett.hale"
+__copyright__ = "brett.hale"
+__license__ = "mit"
+
+
+class TestEssentiaController(TestCase):
+    """
+    The Essentia driver against the amp simulator, fed the way Polyglot
+    feeds it over MQTT.
+    """
+
+    params = {'listen': 'false', 'poll_active': '0'}
+
+    def setUp(self):
+        self.sim = NuvoSimulator('essentia', latency=0.01).start()
+        self.poly = make_interface()
+        self.client = self.poly._mqttc
+        self.control = EssentiaController(self.poly)
+        params = dict(self.params, host=self.sim.host, port=str(self.sim.port))
+        self.poly.inConfig(make_config(customParams=params))
+        self.control._threads['ns'].join(10)
+
+    def tearDown(self):
+        self.poly.stop()
+        self.sim.stop()
+
+    def publish(self, **message):
+        """
+        A message from Polyglot, as paho hands it to Interface._message.
+        """
+        message['node'] = 'polyglot'
+        payload = json.dumps(message).encode('utf-8')
+        self.poly._message(None, None, SimpleNamespace(topic=self.poly.topicInput, payload=payload))
+
+    def test_volume_burst_sends_newest(self):
+        sent = self.sim.commands
+        values = list(range(40, 65))
+        for value in values:
+            self.publish(command={'address': 'z01', 'cmd': 'SET_VOL', 'value': str(value)})
+        self.poly.inQueue.join()
+        newest = EssentiaNode.codec.volume('z01', values[-1])
+        assert self.sim.zones[1].volume == int(re.search(r'VOL(\d+)', newest).group(1))
+        superseded = self.control.lanes.stats()['superseded']
+        assert superseded > 0
+        assert self.sim.commands - sent == len(values) - superseded
+
+    def statuses(self):
+        return [(s['address'], s['driver']) for s in self.client.sent('status')]
+
+    def test_query_reports_every_driver(self):
+        del self.client.messages[:]
+        self.publish(query={'address': 'z01'})
+        self.poly.inQueue.join()
+        assert self.statuses() == [('z01', d['driver']) for d in EssentiaNode.drivers]
+
+    def test_poll_reports_changes(self):
+        del self.client.messages[:]
+        self.control._poll('z01')
+        assert self.statuses() == []
+        self.sim.zones[1].power = True
+        self.control._poll('z01')
+        # on brings source and volume with it, mute is unchanged
+        assert self.statuses() == [('z01', 'ST'), ('z01', 'GV3'), ('z01', 'GV4')]
+
+    def confirm(self, *addresses):
+        """
+        Polyglot's batched answer to the addnode.
+        """
+        self.publish(result={'addnode': {'nodes': [{'address': a, 'success': True} for a in addresses]}})
+        self.poly.inQueue.join()
+
+    def test_first_sweep_waits_for_addnode_results(self):
+        sent = self.sim.commands
+        self.sim.zones[2].power = True
+        assert self.control.nodesAdding == ['controller', 'z01', 'z02', 'z03', 'z04', 'z05', 'z06']
+        self.confirm('controller', 'z01', 'z02', 'z03')
+        assert self.sim.commands == sent and self.statuses() == []
+        self.confirm('z04', 'z05', 'z06')
+        assert self.sim.commands - sent == 6
+        assert ('z02', 'ST') in self.statuses()
+
+    def configure(self, **params):
+        """
+        customParams changed in Polyglot's UI.
+        """
+        params = dict(self.params, host=self.sim.host, port=str(self.sim.port), **params)
+        self.poly.inConfig(make_config(customParams=params))
+
+    def test_changed_params_apply_without_restart(self):
+        self.configure(poll_active='12', full_refresh='600')
+        assert self.control.poller.active == 12 and self.control.fullRefresh == 600
+        transport = self.control.transport
+        other = NuvoSimulator('essentia').start()
+        try:
+            self.poly.inConfig(make_config(customParams=dict(self.params, host=other.host, port=str(other.port))))
+            assert self.control.transport is not transport
+            assert transport.breaker.on_change is None
+            self.publish(command={'address': 'z01', 'cmd': 'DON'})
+            self.poly.inQueue.join()
+            assert other.zones[1].power and not self.sim.zones[1].power
+            # the old connection is closed, one session at a time
+            deadline = time.time() + 3
+            while self.sim._clients and time.time() < deadline:
+                time.sleep(0.01)
+            assert not self.sim._clients
+        finally:
+            other.stop()
+
+    def test_timeout_bounds_the_wire(self):
+        self.configure(timeout='3')
+        assert self.control.transport.timeout == 3 and self.control.transport.client.timeout == 3
+
+    def test_polls_without_a_port(self):
+        poly = make_interface()
+        control = EssentiaController(poly)
+        try:
+            poly.inConfig(make_config(customParams=dict(self.params, host=self.sim.host, metrics_drivers='true')))
+            control._threads['ns'].join(10)
+            # nothing to report on yet, but the timers keep coming
+            control.longPoll()
+            control.shortPoll()
+            assert control.transport is None
+        finally:
+            poly.stop()
+
+    def test_port_added_later_starts_discovery(self):
+        poly = make_interface()
+        control = EssentiaController(poly)
+        try:
+            poly.inConfig(make_config(customParams=dict(self.params, host=self.sim.host)))
+            control._threads['ns'].join(10)
+            assert control.transport is None and not control.zones
+            poly.inConfig(make_config(customParams=dict(self.params, host=self.sim.host, port=str(self.sim.port))))
+            assert control.transport is not None and len(control.zones) == 6
+        finally:
+            poly.stop()
+
+    def test_bad_params_keep_previous_settings(self):
+        self.configure(poll_active='12', metrics_port='0')
+        transport = self.control.transport
+        with self.assertLogs('poly_interface', 'ERROR') as logs:
+            self.configure(poll_active='nan', baud='fast', metrics_port='99999', log_buffer='lots',
+                           breaker_cooldown='0', full_refresh='inf')
+        assert len(logs.output) == 6
+        assert self.control.poller.active == 12 and self.control.metrics_port == 0
+        assert self.control.breaker_cooldown == 30 and self.control.fullRefresh == 0
+        assert self.control.baud == EssentiaController.baud
+        assert self.control.transport is transport
+
+    def test_profile_runs_when_set_or_changed(self):
+        with patch('nuvo_controller.profiler.profile') as profile:
+            self.configure(profile='5')
+            self.configure(profile='5', poll_idle='200')
+            self.configure(profile='a while')
+            self.configure(profile='7')
+        assert [c[0][0] for c in profile.call_args_list] == [5, 7]
+
+    def test_profile_command_checks_seconds(self):
+        with patch('nuvo_controller.profiler.profile') as profile:
+            with self.assertLogs('poly_interface', 'ERROR') as logs:
+                self.publish(command={'address': 'controller', 'cmd': 'PROFILE', 'value': 'soon'})
+                self.poly.inQueue.join()
+            assert ['not a number of seconds' in line for line in logs.output] == [True]
+            self.publish(command={'address': 'controller', 'cmd': 'PROFILE', 'value': '2'})
+            self.poly.inQueue.join()
+        assert [c[0][0] for c in profile.call_args_list] == [2]
+
+    def test_route_status(self):
+        self.control._route_status('#Z09PWRON,SRC3,GRP0,VOL-40,POFF')
+        # z02 is still being added, the first sweep reports it
+        self.control._route_status('#Z02PWRON,SRC3,GRP0,VOL-40,POFF')
+        assert self.statuses() == []
+        assert self.control.zones[2].status['ST'] == 1
+        self.confirm(*self.control.nodesAdding)
+        self.control._route_status('#Z02PWRON,SRC3,GRP0,VOL-40,POFF')
+        del self.client.messages[:]
+        # added, only what changed is reported
+        self.control._route_status('#Z02PWRON,SRC4,GRP0,VOL-40,POFF')
+        assert self.statuses() == [('z02', 'GV3')]
+
+    def test_listener_shares_the_pooled_connection(self):
+        self.configure(listen='true')
+        self.confirm(*self.control.nodesAdding)
+        assert self.control.listener.client is self.control.transport.client
+        pushed = EssentiaNode.codec.decode(self.sim.keypad_event(3))
+        deadline = time.time() + 3
+        while self.control.zones[3].status != pushed and time.time() < deadline:
+            time.sleep(0.01)
+        assert self.control.zones[3].status == pushed
+        # no connection of the listener's own
+        assert len(self.sim._clients) == 1
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import socket
+import threading
+import time
+from unittest import TestCase
+from global_cache import GlobalCache
+from simulator import NuvoSimulator
+
+__author__ = "brett.hale"
+__copyright__ = "brett.hale"
+__license__ = "mit"
+
+
+class FakeAmp(threading.Thread):
+    """
+    Answers every `*Z0n...` line with a canned status for zone n and counts
+    accepted connections. With drop_after set it hangs up after that many replies.
+    """
+
+    def __init__(self, drop_after=None):
+        super(FakeAmp, self).__init__(daemon=True)
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen(5)
+        self.port = self.server.getsockname()[1]
+        self.connections = 0
+        self.drop_after = drop_after
+
+    def run(self):
+        while True:
+            conn, _ = self.server.accept()
+            self.connections += 1
+            replies = 0
+            with conn:
+                buf = b''
+                while self.drop_after is None or replies < self.drop_after:
+                    chunk = conn.recv(64)
+                    if not chunk:
+                        break
+                    buf += chunk
+                    while b'\r\n' in buf:
+                        line, buf = buf.split(b'\r\n', 1)
+                        conn.sendall(b'#Z' + line[2:4] + b'PWRON,SRC2,GRP0,VOL-62,POFF\r\n')
+                        replies += 1
+
+
+class TestPersistent(TestCase):
+
+    def test_reuses_connection(self):
+        amp = FakeAmp()
+        amp.start()
+        gc = GlobalCache('127.0.0.1', amp.port, 2, persistent=True)
+        for _ in range(3):
+            assert gc.msg('*Z01CONSR') == '#Z01PWRON,SRC2,GRP0,VOL-62,POFF'
+        assert amp.connections == 1
+        gc.close()
+
+    def test_reconnects_broken_connection(self):
+        amp = FakeAmp(drop_after=1)
+        amp.start()
+        gc = GlobalCache('127.0.0.1', amp.port, 2, persistent=True)
+        assert gc.msg('*Z01CONSR').startswith('#Z01PWRON')
+        assert gc.msg('*Z01CONSR').startswith('#Z01PWRON')
+        assert amp.connections == 2
+        gc.close()
+
+    def test_msg_many_one_connection(self):
+        amp = FakeAmp()
+        amp.start()
+        gc = GlobalCache('127.0.0.1', amp.port, 2, persistent=True, pool_size=3)
+        results = gc.msg_many(['*Z0{}CONSR'.format(x) for x in range(1, 7)])
+        assert [r[:4] for r in results] == ['#Z0{}'.format(x) for x in range(1, 7)]
+        assert amp.connections == 1
+        gc.close()
+
+    def test_closed_pool_closes_returned_connections(self):
+        amp = FakeAmp()
+        amp.start()
+        gc = GlobalCache('127.0.0.1', amp.port, 2, persistent=True)
+        conn = gc.pool.acquire()
+        gc.close()
+        gc.pool.release(conn)
+        assert conn.sock.fileno() == -1
+        self.assertRaises(RuntimeError, gc.pool.acquire)
+
+    def test_one_session_by_default(self):
+        amp = FakeAmp()
+        amp.start()
+        gc = GlobalCache('127.0.0.1', amp.port, 2, persistent=True)
+        conn = gc.pool.acquire()
+        # watch() finds the only socket handed out and opens none
+        gc.pool.watch(0.05)
+        gc.pool.release(conn)
+        gc.pool.watch(0.05)
+        time.sleep(0.1)
+        assert amp.connections == 1
+        gc.close()
+
+    def test_push_during_exchange_is_not_the_reply(self):
+        sim = NuvoSimulator('essentia', latency=0.2, seed=1).start()
+        pushed = []
+        gc = GlobalCache(sim.host, sim.port, 2, persistent=True, on_unsolicited=pushed.append)
+        timer = threading.Timer(0.05, sim.keypad_event, (3,))
+        timer.start()
+        assert gc.msg('*Z01ON').startswith('#Z01PWRON')
+        assert [line[:5] for line in pushed] == ['#Z03P']
+        # later replies are not a line behind
+        assert gc.msg('*Z02CONSR') == '#Z02PWROFF'
+        gc.close()
+        sim.stop()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+from urllib.request import urlopen
+from metrics import Registry, MetricsServer
+
+__author__ = "brett.hale"
+__copyright__ = "brett.hale"
+__license__ = "mit"
+
+
+class TestMetrics(TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter_labels(self):
+        self.registry.counter('errors_total', kind='timeout').inc()
+        self.registry.counter('errors_total', kind='timeout').inc()
+        self.registry.counter('errors_total', kind='refused').inc(3)
+        assert self.registry.counter('errors_total', kind='timeout').value == 2
+        assert self.registry.total('errors_total') == 5
+
+    def test_gauge_fn(self):
+        depth = [4]
+        self.registry.gauge('depth', lambda: depth[0])
+        depth[0] = 7
+        assert self.registry.summary()['depth'] == 7
+
+    def test_histogram(self):
+        h = self.registry.histogram('latency_seconds', buckets=(0.01, 0.1, 1), cmd='DON')
+        for v in (0.005, 0.05, 0.05, 0.5, 5):
+            h.observe(v)
+        assert h.count == 5
+        assert h.quantile(0.5) == 0.1
+        assert h.quantile(1.0) == 1
+        text = self.registry.render()
+        assert '# TYPE latency_seconds histogram' in text
+        assert 'latency_seconds_bucket{cmd="DON",le="0.1"} 3' in text
+        assert 'latency_seconds_bucket{cmd="DON",le="+Inf"} 5' in text
+        assert 'latency_seconds_count{cmd="DON"} 5' in text
+
+    def test_http(self):
+        self.registry.counter('sent_total').inc()
+        server = MetricsServer(port=0, registry=self.registry).start()
+        try:
+            body = urlopen('http://127.0.0.1:{}/metrics'.format(server.port), timeout=5).read().decode()
+        finally:
+            server.stop()
+        assert 'sent_total 1' in body
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+from pacer import LinePacer, bits_per_char
+
+__author__ = "brett.hale"
+__copyright__ = "brett.hale"
+__license__ = "mit"
+
+
+class TestPacer(TestCase):
+
+    def test_framing(self):
+        assert bits_per_char('8N1') == 10
+        assert bits_per_char('7e2') == 11
+        with self.assertRaises(ValueError):
+            bits_per_char('9X1')
+
+    def test_back_to_back_sends_are_spread(self):
+        pacer = LinePacer(9600, '8N1', reply=30)
+        assert pacer.reserve(10) == 0
+        # 40 bytes of line time at 960 bytes a second
+        assert abs(pacer.reserve(10) - 40 / 960.0) < 0.005
+        assert abs(pacer.reserve(10) - 80 / 960.0) < 0.005
+        assert pacer.paced == 2
+
+    def test_burst(self):
+        pacer = LinePacer(9600, '8N1', burst=60, reply=30)
+        assert pacer.reserve(10) == 0
+        assert pacer.reserve(10) == 0
+        assert pacer.reserve(10) > 0
+
+    def test_learns_reply_size(self):
+        pacer = LinePacer(57600, reply=34)
+        for _ in range(50):
+            pacer.replied(12)
+        assert round(pacer.reply) == 12
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import threading
+import time
+from unittest import TestCase
+from poller import PollScheduler
+
+__author__ = "brett.hale"
+__copyright__ = "brett.hale"
+__license__ = "mit"
+
+
+class TestPollScheduler(TestCase):
+
+    def setUp(self):
+        self.scheduler = PollScheduler(lambda address: None, active=30, idle=300, budget=0.1, window=60)
+        for address in ('z01', 'z02', 'z03'):
+            self.scheduler.add(address)
+        self.now = time.time()
+
+    def test_idle_zones_wait_longer(self):
+        assert self.scheduler.next_poll(self.now + 60)[0] is None
+        self.scheduler.fresh('z02', on=True)
+        assert self.scheduler.next_poll(self.now + 31) == ('z02', 0)
+
+    def test_fresh_state_backs_off(self):
+        self.scheduler.fresh('z01', used=True)
+        self.scheduler.fresh('z02', used=True)
+        self.scheduler.fresh('z02')
+        assert self.scheduler.next_poll(self.now + 31)[0] == 'z01'
+
+    def test_polls_are_spread(self):
+        for address in ('z01', 'z02', 'z03'):
+            self.scheduler.fresh(address, on=True)
+        now = self.now + 31
+        address, _ = self.scheduler.next_poll(now)
+        self.scheduler.record(address, now, 0.01)
+        address, wait = self.scheduler.next_poll(now)
+        assert address is None and 9 < wait <= 10
+        assert self.scheduler.next_poll(now + 10)[0] is not None
+
+    def test_budget(self):
+        for address in ('z01', 'z02', 'z03'):
+            self.scheduler.fresh(address, on=True)
+        now = self.now + 100
+        self.scheduler.record('z01', now, 6)
+        address, wait = self.scheduler.next_poll(now + 20)
+        assert address is None and 39 < wait <= 40
+
+    def test_thread_polls_and_defers(self):
+        polled = []
+        busy = threading.Event()
+        busy.set()
+        scheduler = PollScheduler(polled.append, busy=busy.is_set, active=0.05, idle=0.05, budget=0)
+        scheduler.add('z01')
+        scheduler.start()
+        time.sleep(0.2)
+        assert not polled and scheduler.deferred
+        busy.clear()
+        deadline = time.time() + 3
+        while not polled and time.time() < deadline:
+            time.sleep(0.01)
+        scheduler.stop()
+        assert polled[0] == 'z01'
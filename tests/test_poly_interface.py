@@ -0,0 +1,497 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import json
+import os
+import sys
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+from poly_interface import Controller, DriverTable, InboundQueue, Interface, LaneDispatcher, Node, _Driver, read_stdin_config
+
+__author__ = "brett.hale"
+__copyright__ = "brett.hale"
+__license__ = "mit"
+
+
+class FakePoly:
+    """
+    Stand-in for Interface that keeps what would have been published.
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+    def sendStatuses(self, statuses):
+        self.sent.append({'status': statuses})
+
+
+class FakeController:
+
+    def __init__(self):
+        self.poly = FakePoly()
+
+
+class RecordingClient:
+    """
+    Stands in for paho's client under Interface, keeps every message
+    published.
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, topic, payload, retain=False):
+        self.messages.append(json.loads(payload))
+
+    def sent(self, kind):
+        return [m[kind] for m in self.messages if kind in m]
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        pass
+
+
+def make_interface():
+    """
+    A new Interface publishing to a RecordingClient. Interface redirects
+    stdout and stderr to the log, they are put back.
+    """
+    Interface._Interface__exists = False
+    stdout, stderr = sys.stdout, sys.stderr
+    try:
+        poly = Interface('Test')
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+    poly._mqttc = RecordingClient()
+    poly.connected = True
+    return poly
+
+
+def make_config(nodes=(), **config):
+    """
+    A config message the way Polyglot sends it, nodes given as
+    (address, {driver: value}).
+    """
+    config.setdefault('isyVersion', '5.0.16')
+    config.setdefault('customParams', {})
+    config.setdefault('notices', {})
+    config['nodes'] = [{
+        'address': address,
+        'drivers': [{'driver': driver, 'value': value, 'uom': UOMS[driver]} for driver, value in drivers.items()],
+        'isprimary': address == 'controller',
+        'timeAdded': 0,
+        'enabled': True,
+        'added': 0,
+    } for address, drivers in nodes]
+    return config
+
+
+class ZoneNode(Node):
+    id = 'zone'
+    drivers = [
+        {'driver': 'ST', 'value': 0, 'uom': 2},
+        {'driver': 'GV1', 'value': 0, 'uom': 56},
+    ]
+
+    def start(self):
+        self.started = True
+
+
+UOMS = dict((d['driver'], d['uom']) for d in ZoneNode.drivers)
+
+
+class TestDriverTable(TestCase):
+
+    def setUp(self):
+        self.table = DriverTable(ZoneNode.drivers)
+
+    def test_driver_tracks_reported(self):
+        d = _Driver(0, 2)
+        assert not d.changed()
+        d.value = 1
+        assert d.changed()
+        d.markReported()
+        assert not d.changed() and d.reported == 1
+        d.uom = 25
+        assert d.changed()
+        d.markReported()
+        # compared the way they are sent, as strings
+        d.value = '1'
+        assert not d.changed()
+
+    def test_set_and_changes(self):
+        assert self.table.set('GV1', 40)
+        assert not self.table.set('GV9', 1)
+        assert self.table.toList()[1] == {'driver': 'GV1', 'value': 40, 'uom': 56}
+        assert self.table.changes('z01') == [{'address': 'z01', 'driver': 'GV1', 'value': '40', 'uom': 56}]
+        assert self.table.changes('z01') == []
+        assert [s['driver'] for s in self.table.changes('z01', force=True)] == ['ST', 'GV1']
+
+    def test_change_of_one_driver(self):
+        self.table.set('ST', 1)
+        assert self.table.change('z01', 'GV1') is None
+        assert self.table.change('z01', 'ST')['value'] == '1'
+        assert self.table.change('z01', 'ST') is None
+        assert self.table.change('z01', 'ST', force=True) is not None
+
+    def test_mark_and_load_reported(self):
+        self.table.set('ST', 1)
+        self.table.set('GV1', 30)
+        self.table.markReported()
+        assert self.table.changes('z01') == []
+        self.table.loadReported([{'driver': 'GV1', 'value': 50, 'uom': 56}])
+        assert [s['driver'] for s in self.table.changes('z01')] == ['GV1']
+        self.table.loadReported([{'driver': 'ST', 'value': 0, 'uom': 2}], values=True)
+        assert self.table.get('ST').value == 0 and not self.table.get('ST').changed()
+
+    def test_concurrent_updates_are_each_reported_once(self):
+        reported = []
+
+        def update(value):
+            for n in range(200):
+                self.table.set('GV1', value + n)
+                reported.extend(self.table.changes('z01'))
+
+        threads = [threading.Thread(target=update, args=(v,)) for v in (1000, 2000, 3000)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        last = self.table.get('GV1')
+        assert last.reported == last.value
+        assert reported[-1]['value'] == str(last.value)
+
+
+class TestNodeDrivers(TestCase):
+
+    def setUp(self):
+        self.controller = FakeController()
+        self.node = ZoneNode(self.controller, 'controller', 'z01', 'Zone 1')
+
+    def test_set_driver_reports_changes(self):
+        self.node.setDriver('ST', 1)
+        self.node.setDriver('ST', 1)
+        self.node.setDriver('ST', 1, force=True)
+        self.node.setDriver('GV1', 20, report=False)
+        assert [m['status']['value'] for m in self.controller.poly.sent] == ['1', '1']
+        assert self.node.changedStatuses() == [{'address': 'z01', 'driver': 'GV1', 'value': '20', 'uom': 56}]
+
+    def test_report_drivers_sends_all(self):
+        self.node.setDriver('GV1', 20, report=False)
+        self.node.reportDrivers()
+        assert [s['driver'] for s in self.controller.poly.sent[0]['status']] == ['ST', 'GV1']
+        assert self.node.changedStatuses() == []
+
+    def test_update_drivers(self):
+        # the list Polyglot keeps for the node
+        self.node.updateDrivers([{'driver': 'ST', 'value': 1, 'uom': 2}])
+        assert [s['driver'] for s in self.node.changedStatuses()] == ['ST']
+        # a table: its values become what was last reported for this node
+        self.node.setDriver('GV1', 20, report=False)
+        self.node.updateDrivers(self.node.drivers)
+        assert self.node.changedStatuses() == []
+        other = DriverTable(ZoneNode.drivers)
+        other.set('GV1', 35)
+        self.node.updateDrivers(other)
+        assert self.node.drivers.get('GV1').reported == 35
+        assert other.get('GV1').changed()
+
+
+class TestInboundQueue(TestCase):
+
+    def setUp(self):
+        self.queue = InboundQueue()
+
+    def drain(self):
+        items = []
+        while not self.queue.empty():
+            items.append(self.queue.get_nowait())
+            self.queue.task_done()
+        return items
+
+    def test_commands_first(self):
+        for item in ({'shortPoll': {}}, {'query': {'address': 'z01'}}, {'status': {'address': 'all'}},
+                     {'command': {'address': 'z01', 'cmd': 'DON'}}, {'result': {'addnode': {}}},
+                     {'longPoll': {}}, {'command': {'address': 'z02', 'cmd': 'DOF'}}):
+            self.queue.put(item)
+        assert [next(iter(item)) for item in self.drain()] == \
+            ['command', 'result', 'command', 'query', 'status', 'shortPoll', 'longPoll']
+
+    def test_waiting_duplicates_collapse(self):
+        for item in ({'shortPoll': {}}, {'query': {'address': 'z01'}}, {'shortPoll': {}},
+                     {'query': {'address': 'z02'}}, {'query': {'address': 'z01'}},
+                     {'command': {'address': 'z01', 'cmd': 'DON'}}, {'command': {'address': 'z01', 'cmd': 'DON'}}):
+            self.queue.put(item)
+        assert self.queue.qsize() == 5 and self.queue.collapsed == 2
+        self.drain()
+        # once taken, the same request is queued again
+        self.queue.put({'query': {'address': 'z01'}})
+        assert self.queue.qsize() == 1
+        self.drain()
+        self.queue.join()
+
+    def test_concurrent_duplicates_collapse(self):
+        def put():
+            for _ in range(200):
+                self.queue.put({'query': {'address': 'z01'}})
+
+        threads = [threading.Thread(target=put) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert self.queue.qsize() == 1
+        assert self.queue.collapsed == 8 * 200 - 1
+        self.drain()
+        self.queue.join()
+
+
+class TestLaneDispatcher(TestCase):
+
+    def setUp(self):
+        self.lanes = LaneDispatcher(workers=3, maxPending=8)
+
+    def tearDown(self):
+        self.lanes.stop()
+
+    def test_order_within_an_address(self):
+        ran = []
+        for n in range(8):
+            self.lanes.submit('z01', lambda n: (time.sleep(0.002), ran.append(n)), n)
+        assert self.lanes.join(5)
+        assert ran == list(range(8))
+        assert self.lanes.stats()['lanes']['z01']['served'] == 8
+
+    def test_addresses_run_concurrently(self):
+        release = threading.Event()
+        running = []
+        for address in ('z01', 'z02', 'z03'):
+            self.lanes.submit(address, lambda a: (running.append(a), release.wait(5)), address)
+        deadline = time.time() + 5
+        while len(running) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        # all three are running, none waits for another
+        assert sorted(running) == ['z01', 'z02', 'z03']
+        release.set()
+        assert self.lanes.join(5)
+
+    def test_wait_for_room(self):
+        release = threading.Event()
+        for n in range(8):
+            self.lanes.submit('z01', release.wait, 5)
+        room = threading.Event()
+        threading.Thread(target=lambda: (self.lanes.waitForRoom(), room.set()), daemon=True).start()
+        assert not room.wait(0.1)
+        release.set()
+        assert room.wait(5)
+        assert self.lanes.join(5)
+
+    def test_newer_work_supersedes_waiting(self):
+        superseded = []
+        lanes = LaneDispatcher(workers=1, onSuperseded=lambda args, trace: superseded.append(args[0]))
+        release = threading.Event()
+        ran = []
+        lanes.submit('z01', release.wait, 5)
+        for item in ('vol40', 'vol35', 'vol30'):
+            lanes.submit('z01', ran.append, item, key='SET_VOL')
+        lanes.submit('z01', ran.append, 'on', key=None)
+        lanes.submit('z01', ran.append, 'vol20', key='SET_VOL')
+        lanes.submit('z02', ran.append, 'vol10', key='SET_VOL')
+        release.set()
+        assert lanes.join(5)
+        assert [item for item in ran if item != 'vol10'] == ['vol30', 'on', 'vol20']
+        assert 'vol10' in ran
+        assert superseded == ['vol40', 'vol35']
+        assert lanes.stats()['superseded'] == 2
+        lanes.stop()
+
+    def test_stop_drops_waiting_work(self):
+        release = threading.Event()
+        ran = []
+        self.lanes.submit('z01', release.wait, 5)
+        self.lanes.submit('z01', ran.append, 1)
+        time.sleep(0.05)
+        threading.Timer(0.1, release.set).start()
+        assert self.lanes.stop(5)
+        assert not ran and self.lanes.stats()['dropped'] == 1
+        assert self.lanes.submit('z01', ran.append, 2) is False
+        self.lanes.waitForRoom()
+        assert self.lanes.join(1) and not ran
+
+    def test_stop_hands_back_dropped_work(self):
+        dropped = []
+        lanes = LaneDispatcher(workers=1, onDropped=lambda args, trace: dropped.append(args))
+        release = threading.Event()
+        lanes.submit('z01', release.wait, 5)
+        lanes.submit('z01', print, 'never')
+        time.sleep(0.05)
+        release.set()
+        assert lanes.stop(5)
+        assert dropped == [('never',)]
+
+
+class TestInterface(TestCase):
+
+    def setUp(self):
+        self.poly = make_interface()
+        self.client = self.poly._mqttc
+
+    def tearDown(self):
+        self.poly.stop()
+
+    def test_node_and_driver_index(self):
+        assert self.poly.getNode('z01') is False
+        self.poly.inConfig(make_config([('controller', {'ST': 1}), ('z01', {'ST': 1, 'GV1': 40})]))
+        assert self.poly.getNode('z01')['address'] == 'z01'
+        assert self.poly.getNode('z09') is False
+        assert self.poly.getDriverValue('z01', 'GV1') == 40
+        assert self.poly.getDriverValue('z01', 'GV9') is None
+        assert self.poly.getDriverValue('z09', 'ST') is None
+        self.poly.inConfig(make_config([('z02', {'ST': 0})]))
+        assert self.poly.getNode('z01') is False and self.poly.getDriverValue('z02', 'ST') == 0
+
+    def test_observers_run_for_changed_sections(self):
+        every, params = [], []
+        self.poly.onConfig(every.append)
+        self.poly.onConfig(params.append, sections=('customParams',))
+        self.poly.inConfig(make_config([('z01', {'ST': 0})]))
+        self.poly.inConfig(make_config([('z01', {'ST': 0})]))
+        assert len(every) == 1 and len(params) == 1
+        self.poly.inConfig(make_config([('z01', {'ST': 1})]))
+        assert len(every) == 2 and len(params) == 1
+        self.poly.inConfig(make_config([('z01', {'ST': 1})], customParams={'host': '10.0.0.2'}))
+        assert len(every) == 3 and len(params) == 2
+
+    def test_unchanged_custom_params_are_not_sent(self):
+        self.poly.inConfig(make_config(customParams={'host': '10.0.0.2'}))
+        self.poly.saveCustomParams({'host': '10.0.0.2'})
+        assert self.client.sent('customparams') == []
+        self.poly.saveCustomParams({'host': '10.0.0.3'})
+        self.poly.saveCustomParams({'host': '10.0.0.3'})
+        assert self.client.sent('customparams') == [{'host': '10.0.0.3'}]
+
+    def test_statuses_batched_when_supported(self):
+        statuses = [{'address': 'z01', 'driver': 'ST', 'value': '1', 'uom': 2},
+                    {'address': 'z02', 'driver': 'ST', 'value': '0', 'uom': 2}]
+        self.poly.sendStatuses(statuses)
+        assert self.client.sent('status') == statuses
+        assert not self.poly.supports_feature('batchstatus')
+        self.poly.inConfig(make_config(features=['batchstatus']))
+        assert self.poly.supports_feature('batchstatus')
+        self.poly.sendStatuses(statuses)
+        assert self.client.sent('status')[2:] == [statuses]
+
+    def test_add_nodes_in_one_message(self):
+        controller = FakeController()
+        self.poly.addNodes([ZoneNode(controller, 'controller', 'z01', 'Zone 1'),
+                            ZoneNode(controller, 'controller', 'z02', 'Zone 2')])
+        added = self.client.sent('addnode')
+        assert len(added) == 1
+        assert [n['address'] for n in added[0]['nodes']] == ['z01', 'z02']
+        assert added[0]['nodes'][0]['drivers'] == ZoneNode.drivers
+
+
+class TestStdinConfig(TestCase):
+
+    def setUp(self):
+        read, self.write = os.pipe()
+        self.stdin = os.fdopen(read)
+        self.addCleanup(self.stdin.close)
+        self.addCleanup(os.close, self.write)
+
+    def read(self):
+        with patch.dict(os.environ, {'TOKEN': ''}), patch.object(sys, 'stdin', self.stdin):
+            start = time.time()
+            line = read_stdin_config()
+        return line, time.time() - start
+
+    def test_open_pipe_without_config_gives_up(self):
+        line, took = self.read()
+        assert line == '' and took < 3
+
+    def test_config_is_read_as_it_arrives(self):
+        os.write(self.write, b'{"token": "t"}\n')
+        line, took = self.read()
+        assert line == '{"token": "t"}' and took < 0.5
+
+
+class TestController(TestCase):
+
+    def setUp(self):
+        self.poly = make_interface()
+        self.client = self.poly._mqttc
+        self.controller = Controller(self.poly)
+        self.poly.inConfig(make_config([('controller', {'ST': 1}), ('z01', {'ST': 1, 'GV1': 40})]))
+
+    def tearDown(self):
+        self.poly.stop()
+
+    def test_add_nodes_starts_from_stored_values(self):
+        z01 = ZoneNode(self.controller, 'controller', 'z01', 'Zone 1')
+        z02 = ZoneNode(self.controller, 'controller', 'z02', 'Zone 2')
+        self.controller.addNodes([z01, z02])
+        assert self.controller.nodesAdding == ['z01', 'z02']
+        assert len(self.client.sent('addnode')) == 1
+        # Polyglot's values are taken as already reported
+        assert z01.drivers.get('GV1').value == 40
+        assert z01.changedStatuses() == []
+        assert z02.drivers.get('GV1').value == 0
+
+    def test_batched_addnode_result(self):
+        z01 = ZoneNode(self.controller, 'controller', 'z01', 'Zone 1')
+        z02 = ZoneNode(self.controller, 'controller', 'z02', 'Zone 2')
+        self.controller.addNodes([z01, z02])
+        self.poly.input({'result': {'addnode': {'nodes': [
+            {'address': 'z01', 'success': True},
+            {'address': 'z02', 'success': False},
+        ]}}})
+        self.poly.inQueue.join()
+        assert getattr(z01, 'started', False)
+        # a failed add is answered too
+        assert self.controller.nodesAdding == []
+        assert 'z01' in self.controller.nodes and 'z02' not in self.controller.nodes
+
+    def test_stopped_lanes_leave_nothing_to_join(self):
+        release = threading.Event()
+        z01 = ZoneNode(self.controller, 'controller', 'z01', 'Zone 1')
+        z01.commands = {'HOLD': lambda node, command: release.wait(5)}
+        self.controller.nodes['z01'] = z01
+        for _ in range(2):
+            self.poly.input({'command': {'address': 'z01', 'cmd': 'HOLD'}})
+        time.sleep(0.1)
+        stopper = threading.Thread(target=self.controller.lanes.stop, args=(5,))
+        stopper.start()
+        release.set()
+        stopper.join(5)
+        joined = threading.Thread(target=self.poly.inQueue.join, daemon=True)
+        joined.start()
+        joined.join(2)
+        assert not joined.is_alive()
+
+    def test_report_changes_and_full_refresh(self):
+        z01 = ZoneNode(self.controller, 'controller', 'z01', 'Zone 1')
+        self.controller.addNodes([z01])
+        z01.setDriver('GV1', 45, report=False)
+        self.controller.reportChanges([z01])
+        assert self.client.sent('status') == [{'address': 'z01', 'driver': 'GV1', 'value': '45', 'uom': 56}]
+        self.controller.reportChanges([z01])
+        assert len(self.client.sent('status')) == 1
+        self.controller.fullRefresh = 60
+        self.controller._lastFullReport = time.time() - 61
+        self.controller.reportChanges([z01])
+        reported = set((s['address'], s['driver']) for s in self.client.sent('status')[1:])
+        assert reported == set([('controller', 'ST'), ('z01', 'ST'), ('z01', 'GV1')])
+        assert not self.controller.fullRefreshDue()
+
+    def test_commands_run_in_their_node_lane(self):
+        z01 = ZoneNode(self.controller, 'controller', 'z01', 'Zone 1')
+        self.controller.addNodes([z01])
+        assert self.controller._laneFor({'command': {'address': 'z01', 'cmd': 'DON'}}) == 'z01'
+        assert self.controller._laneFor({'query': {'address': 'all'}}) == 'controller'
+        assert self.controller._laneFor({'shortPoll': {}}) == 'controller'
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase
+from profiler import SamplingProfiler
+
+__author__ = "brett.hale"
+__copyright__ = "brett.hale"
+__license__ = "mit"
+
+
+class TestProfiler(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.stop.wait, name='Waiter', daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.stop.set()
+        shutil.rmtree(self.dir)
+
+    def test_sample_names_threads(self):
+        profiler = SamplingProfiler()
+        profiler.sample()
+        stacks = profiler.collapsed().splitlines()
+        assert any(line.startswith('Waiter;') and ':wait ' in line for line in stacks)
+        # the sampling thread leaves itself out
+        assert not any(line.startswith(threading.current_thread().name + ';') for line in stacks)
+
+    def test_window_writes_file(self):
+        profiler = SamplingProfiler(interval=0.005)
+        path = os.path.join(self.dir, 'logs', 'profile.txt')
+        assert profiler.start(0.1, path)
+        assert not profiler.start(0.1, path)
+        profiler.join(5)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        assert any(line.startswith('Waiter;') for line in lines)
+        assert all(int(line.rsplit(' ', 1)[1]) > 0 for line in lines)
+        assert profiler.top(1)[0][1] > 0
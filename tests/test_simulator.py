@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import socket
+import time
+from unittest import TestCase
+from global_cache import GlobalCache
+from listener import StatusListener
+from simulator import NuvoSimulator
+
+__author__ = "brett.hale"
+__copyright__ = "brett.hale"
+__license__ = "mit"
+
+
+class TestSimulator(TestCase):
+
+    def test_essentia_zone_state(self):
+        sim = NuvoSimulator('essentia').start()
+        gc = GlobalCache(sim.host, sim.port, 2, persistent=True)
+        assert gc.msg('*Z01CONSR') == '#Z01PWROFF'
+        gc.msg('*Z01ON')
+        gc.msg('*Z01SRC2')
+        gc.msg('*Z01VOL62')
+        assert gc.msg('*Z01CONSR') == '#Z01PWRON,SRC2,GRP0,VOL-62,POFF'
+        assert gc.msg('*Z01MTON') == '#Z01PWRON,SRC2,GRP0,VOL-MT,POFF'
+        assert gc.msg('*Z01STATUS?') is False
+        gc.close()
+        sim.stop()
+
+    def test_concerto_zone_state(self):
+        sim = NuvoSimulator('concerto').start()
+        gc = GlobalCache(sim.host, sim.port, 2, persistent=True)
+        gc.msg('*Z3ON')
+        assert gc.msg('*Z3VOL44') == '#Z3,ON,SRC1,VOL44,DND0,LOCK0'
+        assert gc.msg('*ALLOFF') == '#ALLOFF'
+        assert gc.msg('*Z3STATUS?') == '#Z3,OFF'
+        gc.close()
+        sim.stop()
+
+    def test_dropped_reply_times_out(self):
+        sim = NuvoSimulator('essentia', drop=1.0).start()
+        gc = GlobalCache(sim.host, sim.port, 0.2, persistent=True)
+        self.assertRaises(socket.timeout, gc.msg, '*Z01CONSR')
+        assert sim.dropped == 1
+        gc.close()
+        sim.stop()
+
+    def test_keypad_pushes_status(self):
+        sim = NuvoSimulator('essentia', seed=1).start()
+        pushed = []
+        listener = StatusListener(sim.host, sim.port, pushed.append)
+        listener.start()
+        time.sleep(0.2)
+        status = sim.keypad_event(2)
+        time.sleep(0.2)
+        assert pushed == [status]
+        listener.stop()
+        sim.stop()
+
+    def test_listener_reconnects(self):
+        sim = NuvoSimulator('essentia', seed=1).start()
+        pushed = []
+        listener = StatusListener(sim.host, sim.port, pushed.append, retry=0.1)
+        listener.start()
+        time.sleep(0.2)
+        for client in list(sim._clients):
+            client.connection.shutdown(socket.SHUT_RDWR)
+        time.sleep(0.5)
+        status = sim.keypad_event(3)
+        time.sleep(0.2)
+        assert pushed == [status]
+        listener.stop()
+        sim.stop()
+
+    def test_listener_watches_pooled_connection(self):
+        sim = NuvoSimulator('essentia', seed=1).start()
+        pushed = []
+        gc = GlobalCache(sim.host, sim.port, 2, persistent=True, on_unsolicited=pushed.append)
+        listener = StatusListener(sim.host, sim.port, None, retry=0.1, client=gc)
+        listener.start()
+        time.sleep(0.2)
+        status = sim.keypad_event(2)
+        time.sleep(0.2)
+        # the command goes out on the connection being watched
+        assert gc.msg('*Z01CONSR') == '#Z01PWROFF'
+        assert pushed == [status] and len(sim._clients) == 1
+        for client in list(sim._clients):
+            client.connection.shutdown(socket.SHUT_RDWR)
+        time.sleep(0.3)
+        status = sim.keypad_event(4)
+        time.sleep(0.2)
+        assert pushed[1:] == [status] and len(sim._clients) == 1
+        listener.stop()
+        gc.close()
+        sim.stop()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import json
+import os
+import shutil
+import tempfile
+import time
+from unittest import TestCase
+from transport import Transport
+import tracing
+
+__author__ = "brett.hale"
+__copyright__ = "brett.hale"
+__license__ = "mit"
+
+
+class FakeClient:
+
+    def msg(self, msg):
+        return '#' + msg[1:]
+
+
+class TestTracing(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'logs', 'traces.jsonl')
+
+    def tearDown(self):
+        tracing.configure(None)
+        shutil.rmtree(self.dir)
+
+    def read(self, count, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    lines = f.readlines()
+                if len(lines) >= count:
+                    return [json.loads(line) for line in lines]
+            time.sleep(0.01)
+        self.fail('no trace written')
+
+    def test_disabled(self):
+        assert tracing.start('command') is None
+        with tracing.span('runCmd'):
+            pass
+        assert tracing.current() is None
+
+    def test_spans_follow_transport(self):
+        tracing.configure(self.path)
+        transport = Transport(FakeClient())
+        trace = tracing.start('command')
+        with tracing.activate(trace):
+            with tracing.span('send_cmd', cmd='*Z01ON'):
+                assert transport.msg('*Z01ON') == '#Z01ON'
+        assert tracing.current() is None
+        trace.finish()
+        transport.stop()
+        record = self.read(1)[0]
+        assert record['trace'] == trace.id
+        assert record['kind'] == 'command'
+        names = [span['name'] for span in record['spans']]
+        assert names == ['send_cmd', 'transport_wait', 'wire']
+        assert record['spans'][2]['result'] == 'ok'
+
+    def test_min_ms(self):
+        tracing.configure(self.path, min_ms=50)
+        tracing.start('query').finish()
+        slow = tracing.start('command')
+        slow.start -= 0.1
+        slow.finish()
+        assert [record['trace'] for record in self.read(1)] == [slow.id]
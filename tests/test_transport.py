@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import socket
+import threading
+import time
+from unittest import TestCase
+from breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN
+from transport import Transport, REFRESH
+
+__author__ = "brett.hale"
+__copyright__ = "brett.hale"
+__license__ = "mit"
+
+
+class SlowClient:
+    """
+    Stand-in for GlobalCache that records overlapping calls.
+    """
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.sent = []
+        self.active = 0
+        self.overlapped = False
+
+    def msg(self, msg):
+        self.active += 1
+        self.overlapped = self.overlapped or self.active > 1
+        time.sleep(self.delay)
+        self.sent.append(msg)
+        self.active -= 1
+        return '#' + msg[1:]
+
+
+class ClosingClient(SlowClient):
+
+    def __init__(self, delay=0.01):
+        super(ClosingClient, self).__init__(delay)
+        self.closed_after = None
+
+    def close(self):
+        self.closed_after = list(self.sent)
+
+
+class DeadClient:
+
+    def __init__(self):
+        self.calls = 0
+
+    def msg(self, msg):
+        self.calls += 1
+        raise ConnectionRefusedError
+
+
+class TestTransport(TestCase):
+
+    def test_serializes_concurrent_callers(self):
+        client = SlowClient()
+        transport = Transport(client)
+        threads = [threading.Thread(target=transport.msg, args=('*Z0{}ON'.format(x),)) for x in range(1, 7)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert not client.overlapped
+        assert sorted(client.sent) == ['*Z0{}ON'.format(x) for x in range(1, 7)]
+        stats = transport.stats()
+        assert stats['served'] == 6
+        assert stats['wait_max'] > 0
+        transport.stop()
+
+    def test_stop_serves_queued_then_closes(self):
+        client = ClosingClient(delay=0.05)
+        transport = Transport(client)
+        futures = [transport.submit('*Z0{}ON'.format(x)) for x in range(1, 4)]
+        transport.stop()
+        assert all(f.done() for f in futures)
+        assert client.closed_after == ['*Z0{}ON'.format(x) for x in range(1, 4)]
+
+    def test_msg_many_without_pipelining(self):
+        transport = Transport(SlowClient(0))
+        assert transport.msg_many(['*Z01OFF', '*Z02OFF']) == ['#Z01OFF', '#Z02OFF']
+        transport.stop()
+
+    def test_commands_go_ahead_of_refresh(self):
+        client = SlowClient(0.05)
+        transport = Transport(client)
+        busy = transport.submit('*Z02ON')
+        sweep = threading.Thread(target=transport.msg_many, args=(['*Z01CONSR', '*Z02CONSR'],))
+        sweep.start()
+        time.sleep(0.01)
+        poll = transport.submit('*Z03CONSR', REFRESH)
+        command = transport.submit('*Z04ON')
+        for f in (busy, poll, command):
+            f.result()
+        sweep.join()
+        assert client.sent == ['*Z02ON', '*Z04ON', '*Z01CONSR', '*Z02CONSR', '*Z03CONSR']
+        transport.stop()
+
+    def test_command_goes_between_batch_commands(self):
+        client = SlowClient(0.03)
+        transport = Transport(client)
+        cmds = ['*Z0{}CONSR'.format(x) for x in range(1, 7)]
+        sweep = threading.Thread(target=transport.msg_many, args=(cmds,))
+        sweep.start()
+        time.sleep(0.04)
+        started = time.time()
+        transport.msg('*Z04ON')
+        assert time.time() - started < 0.1
+        sweep.join()
+        assert client.sent.index('*Z04ON') in range(1, 6)
+        assert [c for c in client.sent if c != '*Z04ON'] == cmds
+        transport.stop()
+
+    def test_deadline(self):
+        transport = Transport(SlowClient(0.2), timeout=0.05)
+        self.assertRaises(socket.timeout, transport.msg, '*Z01ON')
+        transport.stop()
+
+    def test_breaker_fails_fast_then_recovers(self):
+        states = []
+        client = DeadClient()
+        breaker = CircuitBreaker(threshold=2, cooldown=0.05, on_change=states.append)
+        transport = Transport(client, breaker=breaker)
+        for _ in range(2):
+            self.assertRaises(ConnectionRefusedError, transport.msg, '*Z01ON')
+        self.assertRaises(CircuitOpenError, transport.msg, '*Z01ON')
+        assert client.calls == 2
+        time.sleep(0.2)
+        assert states == [OPEN, CLOSED]
+        self.assertRaises(ConnectionRefusedError, transport.msg, '*Z01ON')
+        transport.stop()
+
+    def test_stopped_breaker_reports_nothing(self):
+        states = []
+        breaker = CircuitBreaker(threshold=1, cooldown=0.05, on_change=states.append)
+        breaker.failure()
+        breaker.stop()
+        time.sleep(0.2)
+        assert states == [OPEN] and breaker.state == OPEN